@@ -0,0 +1,113 @@
+import pygame as pg
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import perf_counter
+from settings import *
+
+# Directories of the images the game loads, by asset group
+ASSET_GROUPS = {
+    "textures": "resources/textures",
+    "animated sprites": "resources/sprites/animated_sprites",
+    "npcs": "resources/sprites/npc",
+    "weapon": "resources/sprites/weapon/shotgun",
+}
+
+
+class AssetLoader:
+    """Decode image files on a thread pool while drawing a progress screen"""
+
+    def __init__(self, game, threads=ASSET_LOADER_THREADS):
+        """Initialize asset loader"""
+        self.game = game
+        self.threads = threads
+        # Seconds spent decoding the files of each asset group
+        self.decode_times = {}
+        # Seconds spent decoding each file
+        self.file_times = {}
+        # Seconds spent building each game object
+        self.build_times = {}
+        self.font = pg.font.Font(None, 36)
+
+    def get_files(self):
+        """Get the image files that aren't in the asset pack, by asset group"""
+        files = {}
+        for group, path in ASSET_GROUPS.items():
+            for directory, _, file_names in os.walk(path):
+                for file_name in sorted(file_names):
+                    file_path = os.path.join(directory, file_name).replace(os.sep, "/")
+                    if file_name.endswith(".png") and not self.game.assets.is_packed(
+                        file_path
+                    ):
+                        files[file_path] = group
+        return files
+
+    @staticmethod
+    def decode(path):
+        """Decode an image file, returns the image and how long it took"""
+        start = perf_counter()
+        image = pg.image.load(path)
+        return image, perf_counter() - start
+
+    def load(self, steps):
+        """Decode the image files, then build the game objects of each step as
+        (attribute name, class) on the game"""
+        files = self.get_files()
+        total = len(files) + len(steps)
+        self.decode_times = dict.fromkeys(ASSET_GROUPS, 0.0)
+        self.file_times = {}
+        self.build_times = {}
+
+        # Decode on the thread pool & keep the progress screen up to date
+        with ThreadPoolExecutor(self.threads) as executor:
+            futures = {executor.submit(self.decode, path): path for path in files}
+            for done, future in enumerate(as_completed(futures)):
+                path = futures[future]
+                image, elapsed = future.result()
+                # Surfaces are converted on this thread when the game object
+                # that uses them is built
+                self.game.assets.decoded[path] = image
+                self.decode_times[files[path]] += elapsed
+                self.file_times[path] = elapsed
+                self.draw_progress(f"Decoding {files[path]}", done + 1, total)
+
+        # Build the game objects on this thread, they convert their surfaces
+        for done, (name, game_object) in enumerate(steps, len(files)):
+            self.draw_progress(f"Building {name.replace('_', ' ')}", done, total)
+            start = perf_counter()
+            setattr(self.game, name, game_object(self.game))
+            self.build_times[name] = perf_counter() - start
+        # Free the decoded images that weren't used
+        self.game.assets.decoded.clear()
+        if ASSET_LOADER_REPORT:
+            self.report()
+
+    def draw_progress(self, text, done, total):
+        """Draw the loading progress screen"""
+        screen = self.game.screen
+        screen.fill("black")
+        # Draw the progress bar
+        bar = pg.Rect(0, 0, WIDTH // 2, 30)
+        bar.center = HALF_WIDTH, HALF_HEIGHT
+        pg.draw.rect(screen, "darkgray", bar, 2)
+        pg.draw.rect(
+            screen,
+            "darkred",
+            (bar.x + 4, bar.y + 4, (bar.width - 8) * done // total, bar.height - 8),
+        )
+        # Draw what is being loaded above the bar
+        image = self.font.render(text, True, "white")
+        screen.blit(image, image.get_rect(midbottom=(HALF_WIDTH, bar.y - 10)))
+        pg.display.flip()
+        # Keep the window responsive while loading
+        pg.event.pump()
+
+    def report(self, slowest=5):
+        """Print the time spent on each asset group and the slowest files"""
+        print(f"{'asset group':<60}{'ms':>10}")
+        for group, seconds in self.decode_times.items():
+            print(f"{'decoding ' + group:<60}{seconds * 1000:10.2f}")
+        for name, seconds in self.build_times.items():
+            print(f"{'building ' + name.replace('_', ' '):<60}{seconds * 1000:10.2f}")
+        # Print the files that took longest to decode
+        for path in sorted(self.file_times, key=self.file_times.get)[::-1][:slowest]:
+            print(f"{path:<60}{self.file_times[path] * 1000:10.2f}")
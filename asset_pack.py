@@ -0,0 +1,204 @@
+import os
+
+# Build the pack without a window or sound card
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame as pg
+import json
+import mmap
+import struct
+from settings import *
+
+
+class AssetPack:
+    """Pack of decoded & scaled images and sounds that is memory mapped at startup"""
+
+    # Identifies pack files and the version of their layout
+    MAGIC = b"RFPACK01"
+
+    def __init__(self, path=ASSET_PACK_PATH):
+        """Initialize asset pack, path is None to always load from the source files"""
+        self.path = path
+        # Map asset keys to (offset, length, width, height) of their data in the pack
+        self.index = {}
+        # Map asset keys to the source file they were decoded from
+        self.asset_sources = {}
+        # Map source files to their [modification time, size] when they were packed
+        self.sources = {}
+        # Assets decoded since the pack was opened, as key -> (data, width, height)
+        self.pending = {}
+        # Image files decoded ahead of time, but not converted yet
+        self.decoded = {}
+        # Memory mapped pack file & a view of its bytes
+        self.mmap = None
+        self.data = None
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.open()
+
+    def open(self):
+        """Memory map the pack file and read its index"""
+        try:
+            with open(self.path, "rb") as file:
+                self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.mmap[: len(self.MAGIC)] != self.MAGIC:
+                raise ValueError("not an asset pack")
+            # The index is stored as json after the magic & its length
+            (index_size,) = struct.unpack_from("<I", self.mmap, len(self.MAGIC))
+            index_start = len(self.MAGIC) + 4
+            header = json.loads(self.mmap[index_start : index_start + index_size])
+        except (OSError, ValueError, struct.error):
+            # Missing, truncated or unreadable packs are rebuilt from the source
+            # files
+            self.close()
+            return
+        self.data = memoryview(self.mmap)
+        data_start = index_start + index_size
+        # Only use assets whose source file hasn't changed since it was packed
+        for source, stat in header["sources"].items():
+            if self.get_stat(source) == stat:
+                self.sources[source] = stat
+        for key, (source, offset, length, width, height) in header["assets"].items():
+            if source in self.sources:
+                self.index[key] = data_start + offset, length, width, height
+                self.asset_sources[key] = source
+
+    def close(self):
+        """Unmap the pack file"""
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+
+    @staticmethod
+    def get_stat(path):
+        """Get the modification time & size of a file, None if it doesn't exist"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def is_packed(self, path):
+        """Check if the assets of a source file are in the pack"""
+        return path in self.sources
+
+    def get_data(self, key):
+        """Get the data & size of a packed asset, None if it isn't packed"""
+        entry = self.index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, length, width, height = entry
+        return self.data[offset : offset + length], (width, height)
+
+    def add(self, key, source, data, size=(0, 0)):
+        """Add a decoded asset to be written to the pack on the next save"""
+        if self.path:
+            self.pending[key] = data, *size
+            self.asset_sources[key] = source
+            self.sources[source] = self.get_stat(source)
+
+    def load_image(self, path, size=None):
+        """Load an image converted for fast blitting, optionally scaled to a size"""
+        if size is not None:
+            size = tuple(map(int, size))
+        key = f"image:{path}:{size}"
+        packed = self.get_data(key)
+        if packed is not None:
+            return pg.image.frombuffer(*packed, "RGBA").convert_alpha()
+        # Decode and scale the image, then remember the result for the pack
+        image = self.decoded.get(path) or pg.image.load(path)
+        image = image.convert_alpha()
+        if size is not None:
+            image = pg.transform.scale(image, size)
+        self.add(key, path, pg.image.tobytes(image, "RGBA"), image.get_size())
+        return image
+
+    def load_sound(self, path):
+        """Load a sound decoded to the mixer's sample format"""
+        # Decoded samples depend on the mixer's frequency, format & channels
+        key = f"sound:{path}:{pg.mixer.get_init()}"
+        packed = self.get_data(key)
+        if packed is not None:
+            return pg.mixer.Sound(buffer=bytes(packed[0]))
+        sound = pg.mixer.Sound(path)
+        self.add(key, path, sound.get_raw())
+        return sound
+
+    def save(self):
+        """Write the pack with the assets decoded since it was opened"""
+        if not self.path or not self.pending:
+            return
+        # Keep the packed assets & add the new ones
+        assets = {
+            key: (self.data[offset : offset + length], width, height)
+            for key, (offset, length, width, height) in self.index.items()
+        }
+        assets.update(self.pending)
+        header = {"sources": self.sources, "assets": {}}
+        offset = 0
+        for key, (data, width, height) in assets.items():
+            header["assets"][key] = (
+                self.asset_sources[key],
+                offset,
+                len(data),
+                width,
+                height,
+            )
+            offset += len(data)
+        index = json.dumps(header).encode()
+
+        # Write to a temporary file first so a failed write leaves the old pack
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(self.MAGIC)
+            file.write(struct.pack("<I", len(index)))
+            file.write(index)
+            for data, _, _ in assets.values():
+                file.write(data)
+        # Unmap the old pack before replacing it, mapped files can't be replaced
+        # on Windows (drop the views of the old pack first)
+        del assets, data
+        self.close()
+        os.replace(temp_path, self.path)
+        # Map the new pack
+        self.index.clear()
+        self.pending.clear()
+        self.open()
+
+    def build(self, path="resources"):
+        """Pack every image and sound under a directory at its original size"""
+        for directory, _, file_names in os.walk(path):
+            for file_name in sorted(file_names):
+                file_path = os.path.join(directory, file_name).replace(os.sep, "/")
+                if file_name.endswith(".png"):
+                    self.load_image(file_path)
+                elif file_name.endswith(".wav"):
+                    self.load_sound(file_path)
+        self.save()
+
+
+def main():
+    """Build the asset pack, including the scaled images the game uses"""
+    from main import Game
+
+    # Starting a game loads (and packs) every asset at the size the game uses
+    game = Game()
+    # Also pack every other resource at its original size
+    game.assets.build()
+    print(
+        f"{len(game.assets.index)} assets packed in {game.assets.path} "
+        f"({os.path.getsize(game.assets.path) / 1024 / 1024:.1f} MiB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+import os
+
+# Run without a window or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from main import *
+import argparse
+import json
+import random
+import time
+
+# Waypoints of the scripted camera path through the open areas of mini_map
+CAMERA_PATH = [
+    (1.5, 6.5),
+    (10.5, 6.5),
+    (10.5, 12.5),
+    (4.5, 13.5),
+    (4.5, 20.5),
+    (4.5, 26.5),
+    (13.5, 26.5),
+]
+
+
+def get_camera(frame, frames_per_waypoint=120):
+    """Get the scripted camera position and angle of a frame"""
+    # Find the path segment the frame falls on
+    segment, step = divmod(frame, frames_per_waypoint)
+    segment %= len(CAMERA_PATH) - 1
+    (x0, y0), (x1, y1) = CAMERA_PATH[segment], CAMERA_PATH[segment + 1]
+    # Move linearly along the segment
+    t = step / frames_per_waypoint
+    x, y = x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+    # Look in the direction of travel while sweeping from side to side
+    angle = math.atan2(y1 - y0, x1 - x0) + math.sin(frame * 0.05) * HALF_FOV
+    return x, y, angle % math.tau
+
+
+def percentile(values, percent):
+    """Get a percentile of a list of values using the nearest rank"""
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[rank]
+
+
+def summarize(times):
+    """Get the mean and percentiles of a list of times in milliseconds"""
+    return {
+        "mean": sum(times) / len(times),
+        "p50": percentile(times, 50),
+        "p95": percentile(times, 95),
+        "p99": percentile(times, 99),
+    }
+
+
+def timed(call, times):
+    """Call a function and record how long it took in milliseconds"""
+    start = time.perf_counter()
+    call()
+    times.append((time.perf_counter() - start) * 1000)
+
+
+def benchmark_game(frames, warmup, seed):
+    """Run the game loop headless along the scripted camera path"""
+    # Seed npc spawns, npc accuracy and npc attack distances
+    random.seed(seed)
+    game = Game()
+    # Fix the frame time so movement doesn't depend on the machine
+    game.delta_time = 1000 / 60
+
+    frame_times = []
+    subsystems = {
+        "player.update": [],
+        "raycasting.update": [],
+        "object_handler.update": [],
+        "object_renderer.draw": [],
+    }
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            # Discard the warmup timings
+            frame_times.clear()
+            for times in subsystems.values():
+                times.clear()
+        frame_start = time.perf_counter()
+        game.check_events()
+        timed(game.player.update, subsystems["player.update"])
+        # Override player input with the scripted camera
+        game.player.x, game.player.y, game.player.angle = get_camera(frame)
+        game.player.rel = 0
+        # Keep the player alive so the run is never interrupted by a game over
+        game.player.health = PLAYER_MAX_HEALTH
+        timed(game.raycasting.update, subsystems["raycasting.update"])
+        timed(game.object_handler.update, subsystems["object_handler.update"])
+        game.weapon.update()
+        timed(game.object_renderer.draw, subsystems["object_renderer.draw"])
+        game.weapon.draw()
+        game.map.draw_minimap()
+        pg.display.flip()
+        frame_times.append((time.perf_counter() - frame_start) * 1000)
+
+    return {
+        "frames": frames,
+        "frame": summarize(frame_times),
+        "subsystems": {name: summarize(times) for name, times in subsystems.items()},
+    }
+
+
+def benchmark_rays(frames, warmup, seed):
+    """Compare full density and adaptive ray casting along the camera path"""
+    random.seed(seed)
+    game = Game()
+    raycasting = game.raycasting
+    engines = {
+        "full": raycasting.ray_cast_vectorized,
+        "adaptive": raycasting.ray_cast_adaptive,
+    }
+
+    times = {name: [] for name in engines}
+    rays_cast = []
+    mismatched_rays = 0
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            # Discard the warmup timings
+            for engine_times in times.values():
+                engine_times.clear()
+            rays_cast.clear()
+            mismatched_rays = 0
+        game.player.x, game.player.y, game.player.angle = get_camera(frame)
+        results = {}
+        for name, engine in engines.items():
+            timed(engine, times[name])
+            results[name] = raycasting.projection
+        rays_cast.append(raycasting.rays_cast)
+        # Count rays whose wall, texture column or height differ from full density
+        mismatched_rays += count_mismatched_rays(results["full"], results["adaptive"])
+
+    return {
+        "frames": frames,
+        "rays": raycasting.num_rays,
+        "adaptive rays cast": sum(rays_cast) / len(rays_cast),
+        "mismatched rays": mismatched_rays / (frames * raycasting.num_rays),
+        "subsystems": {name: summarize(times[name]) for name in engines},
+    }
+
+
+def count_mismatched_rays(projection, other_projection):
+    """Count the rays of two ray casting results that hit a different wall, texture
+    column or height"""
+    _, proj_height, texture, offset = projection
+    _, other_proj_height, other_texture, other_offset = other_projection
+    match = (
+        (texture == other_texture)
+        & np.isclose(proj_height, other_proj_height, rtol=1e-6, atol=0)
+        & np.isclose(offset, other_offset, rtol=0, atol=1e-6)
+    )
+    return int(np.count_nonzero(~match))
+
+
+def benchmark_parity(frames, warmup, seed):
+    """Check the numpy, rotation reuse & selected ray casting engines against the
+    scalar one from random poses in the open tiles of the map, frames is the
+    number of poses"""
+    random.seed(seed)
+    game = Game()
+    raycasting = game.raycasting
+    engines = {
+        "scalar": raycasting.ray_cast,
+        "numpy": raycasting.ray_cast_vectorized,
+        "rotation reuse": raycasting.ray_cast_incremental,
+    }
+    # Check the engine the settings select too, if it isn't one of those
+    if raycasting.ray_cast_engine not in engines.values():
+        engines["default"] = raycasting.ray_cast_engine
+    # Number of ray angles in a full turn
+    lattice_size = round(math.tau / raycasting.delta_angle)
+    open_tiles = [
+        (x, y)
+        for y in range(game.map.rows)
+        for x in range(game.map.cols)
+        if not game.map.is_wall(x, y)
+    ]
+
+    times = {name: [] for name in engines}
+    compared_rays = mismatched_rays = 0
+    for pose in range(warmup + frames):
+        if pose == warmup:
+            # Discard the warmup timings
+            for engine_times in times.values():
+                engine_times.clear()
+            compared_rays = mismatched_rays = 0
+        x, y = random.choice(open_tiles)
+        game.player.x, game.player.y = x + random.random(), y + random.random()
+        # Face along the angles the rotation reuse engine snaps its rays to, then
+        # turn in place by whole rays so it reuses the overlapping rays
+        first_ray = random.randrange(lattice_size)
+        for turn in 0, random.randrange(1, raycasting.num_rays):
+            game.player.angle = (first_ray + turn) * raycasting.delta_angle + HALF_FOV
+            results = {}
+            for name, engine in engines.items():
+                timed(engine, times[name])
+                results[name] = raycasting.projection
+            for name in engines:
+                if name != "scalar":
+                    compared_rays += raycasting.num_rays
+                    mismatched_rays += count_mismatched_rays(
+                        results["scalar"], results[name]
+                    )
+
+    return {
+        "frames": frames,
+        "parity rays": compared_rays,
+        "parity mismatches": mismatched_rays,
+        "subsystems": {name: summarize(times[name]) for name in engines},
+    }
+
+
+def benchmark_floor(frames, warmup, seed):
+    """Time drawing the background with floor & ceiling casting at each scale"""
+    random.seed(seed)
+    game = Game()
+    renderer = game.object_renderer
+    # Flat floor & sky, then textured floor & ceiling at each resolution scale
+    configs = {"flat": (None, None, 1)}
+    for scale in (1, 2, 4):
+        configs[f"floor x{scale}"] = 1, None, scale
+        configs[f"floor+ceiling x{scale}"] = 1, 3, scale
+
+    times = {name: [] for name in configs}
+    for name, (floor_texture, ceiling_texture, scale) in configs.items():
+        renderer.floor_texture = floor_texture
+        renderer.ceiling_texture = ceiling_texture
+        renderer.set_floor_scale(scale)
+        for frame in range(warmup + frames):
+            if frame == warmup:
+                # Discard the warmup timings
+                times[name].clear()
+            game.player.x, game.player.y, game.player.angle = get_camera(frame)
+            timed(renderer.draw_background, times[name])
+
+    return {
+        "frames": frames,
+        "subsystems": {name: summarize(times[name]) for name in configs},
+    }
+
+
+def benchmark_shading(frames, warmup, seed):
+    """Time rendering a frame with each number of distance shading levels"""
+    random.seed(seed)
+    game = Game()
+
+    def render():
+        """Cast the walls, project the sprites and draw the frame"""
+        game.raycasting.update()
+        game.object_handler.update()
+        game.object_renderer.draw()
+
+    times = {}
+    for levels in (0, 4, 16):
+        name = f"{levels} levels" if levels else "off"
+        times[name] = []
+        game.object_renderer.set_shading(levels)
+        for frame in range(warmup + frames):
+            if frame == warmup:
+                # Discard the warmup timings
+                times[name].clear()
+            game.player.x, game.player.y, game.player.angle = get_camera(frame)
+            game.player.health = PLAYER_MAX_HEALTH
+            timed(render, times[name])
+
+    return {
+        "frames": frames,
+        "subsystems": {name: summarize(times[name]) for name in times},
+    }
+
+
+def generate_map(size, density=0.3, seed=0):
+    """Generate a square map of random wall tiles inside a border of walls"""
+    rng = random.Random(seed)
+    return [
+        [
+            (
+                1
+                if x in (0, size - 1) or y in (0, size - 1) or rng.random() < density
+                else 0
+            )
+            for x in range(size)
+        ]
+        for y in range(size)
+    ]
+
+
+def get_path_queries(graph, count, seed=0):
+    """Get random start & goal pairs that are connected in a map graph"""
+    rng = random.Random(seed)
+    # Find the largest group of connected tiles
+    region = set()
+    unvisited = set(graph)
+    while unvisited:
+        start = unvisited.pop()
+        group, queue = {start}, [start]
+        while queue:
+            for node in graph[queue.pop()]:
+                if node not in group:
+                    group.add(node)
+                    queue.append(node)
+        unvisited -= group
+        if len(group) > len(region):
+            region = group
+    nodes = sorted(region)
+    return [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+
+def benchmark_paths(frames, warmup, seed, modes=("bfs", "astar"), sizes=(64, 128, 256)):
+    """Compare the nodes expanded & time taken by path queries of each mode on
+    the built-in map and on generated maps, frames is the number of queries per
+    map"""
+    random.seed(seed)
+    game = Game()
+    # Paths between random tiles, not blocked by the npcs of the built-in map
+    game.object_handler.npc_positions = set()
+    maps = {"built-in": game.map}
+    for size in sizes:
+        maps[f"{size}x{size}"] = Map(game, generate_map(size, seed=seed))
+
+    times = {}
+    nodes = {}
+    for map_name, game_map in maps.items():
+        game.map = game_map
+        pathfinding = PathFinding(game)
+        # Pick tiles that are connected without cutting corners, so every
+        # search can reach the goal
+        graph = {
+            node: [next_node for next_node, _ in next_nodes]
+            for node, next_nodes in pathfinding.weighted_graph.items()
+        }
+        queries = get_path_queries(graph, warmup + frames, seed)
+        if "hpa" in modes:
+            # Time building the clusters, entrances & paths between them once
+            times[f"hpa build {map_name}"] = []
+            timed(pathfinding.get_hierarchical, times[f"hpa build {map_name}"])
+        for mode in modes:
+            name = f"{mode} {map_name}"
+            times[name] = []
+            for query, (start, goal) in enumerate(queries):
+                if query == warmup:
+                    # Discard the warmup timings
+                    times[name].clear()
+                    nodes_expanded = pathfinding.nodes_expanded
+                timed(lambda: pathfinding.find_path(start, goal, mode), times[name])
+            nodes[name] = (pathfinding.nodes_expanded - nodes_expanded) / frames
+
+    return {
+        "frames": frames,
+        "nodes": nodes,
+        "subsystems": {name: summarize(times[name]) for name in times},
+    }
+
+
+def benchmark_hpa(frames, warmup, seed):
+    """Compare A* and hierarchical path query latency as the map grows"""
+    return benchmark_paths(
+        frames, warmup, seed, modes=("astar", "hpa"), sizes=(64, 128, 256, 512)
+    )
+
+
+def print_results(results):
+    """Print benchmark results as a table"""
+    rows = dict(results["subsystems"])
+    if "frame" in results:
+        rows = {"frame": results["frame"], **rows}
+    width = max(len(name) for name in rows)
+    if "rays" in results:
+        print(
+            f"{results['rays']} rays per frame, adaptive casts "
+            f"{results['adaptive rays cast']:.1f} on average, "
+            f"{results['mismatched rays']:.4%} of rays differ"
+        )
+    if "parity rays" in results:
+        print(
+            f"{results['parity mismatches']} of {results['parity rays']} rays differ "
+            "from the scalar engine"
+        )
+    # Path benchmarks also report the mean nodes expanded by each query
+    nodes = results.get("nodes", {})
+    print(f"{results['frames']} frames, times in ms")
+    print(
+        f"{'':{width}}  {'mean':>8}{'p50':>8}{'p95':>8}{'p99':>8}"
+        + (f"{'nodes':>10}" if nodes else "")
+    )
+    for name, stats in rows.items():
+        print(
+            f"{name:{width}}  {stats['mean']:8.2f}{stats['p50']:8.2f}"
+            f"{stats['p95']:8.2f}{stats['p99']:8.2f}"
+            + (f"{nodes[name]:10.1f}" if name in nodes else "")
+        )
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    benchmarks = {
+        "game": (benchmark_game, "headless game loop"),
+        "rays": (benchmark_rays, "full density vs adaptive ray casting"),
+        "parity": (benchmark_parity, "scalar vs numpy ray casting from random poses"),
+        "floor": (benchmark_floor, "floor & ceiling casting at each resolution"),
+        "shading": (benchmark_shading, "rendering with each number of shading levels"),
+        "paths": (benchmark_paths, "bfs vs A* path queries on growing maps"),
+        "hpa": (benchmark_hpa, "A* vs hierarchical path queries up to 512x512"),
+    }
+    parser = argparse.ArgumentParser(description="Headless benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for name, (_, description) in benchmarks.items():
+        subparser = subparsers.add_parser(name, help=description)
+        subparser.add_argument("--frames", type=int, default=600, help="frames to time")
+        subparser.add_argument("--warmup", type=int, default=60, help="untimed frames")
+        subparser.add_argument("--seed", type=int, default=0, help="random seed")
+        subparser.add_argument("--json", help="also write results to this json file")
+    args = parser.parse_args()
+
+    benchmark, _ = benchmarks[args.benchmark]
+    results = benchmark(args.frames, args.warmup, args.seed)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    # Fail if the ray casting engines disagree
+    if results.get("parity mismatches"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from settings import *
+
+
+class DynamicResolution:
+    """Adjust the ray count to keep frame times within a budget"""
+
+    def __init__(self, game, budget=FRAME_TIME_BUDGET):
+        """Initialize dynamic resolution"""
+        self.game = game
+        self.budget = budget
+        # Column widths from highest to lowest quality
+        self.scales = sorted(DYNAMIC_RESOLUTION_SCALES)
+        # Start at the configured column width
+        self.level = self.scales.index(SCALE) if SCALE in self.scales else 0
+        # Initialize smoothed frame time
+        self.frame_time = budget
+        # Frames to wait after a change before changing again
+        self.cooldown = 0
+
+    @property
+    def scale(self):
+        """Current width of the screen column drawn by each ray"""
+        return self.scales[self.level]
+
+    def apply(self):
+        """Apply the current resolution to the ray caster"""
+        if self.game.raycasting.scale != self.scale:
+            self.game.raycasting.set_scale(self.scale)
+        # Let the frame time settle at the new resolution
+        self.frame_time = self.budget
+        self.cooldown = DYNAMIC_RESOLUTION_COOLDOWN
+
+    def update(self):
+        """Lower or raise the resolution based on the last frame time"""
+        # Smooth the frame time so single slow frames don't change resolution
+        self.frame_time += (self.game.delta_time - self.frame_time) * 0.1
+        if self.cooldown:
+            self.cooldown -= 1
+        # If frames take too long, lower the resolution
+        elif self.frame_time > self.budget and self.level < len(self.scales) - 1:
+            self.level += 1
+            self.apply()
+        # If there is headroom, raise the resolution
+        elif (
+            self.frame_time < self.budget * DYNAMIC_RESOLUTION_HEADROOM
+            and self.level > 0
+        ):
+            self.level -= 1
+            self.apply()
@@ -0,0 +1,252 @@
+from heapq import heappop, heappush
+from settings import *
+
+
+class HierarchicalPathFinding:
+    """Hierarchical (HPA*) pathfinding over square clusters of map tiles"""
+
+    # Open stretches of a cluster border longer than this get an entrance at each
+    # end instead of a single one in the middle
+    MAX_SINGLE_ENTRANCE = 6
+
+    def __init__(self, pathfinding, cluster_size=HPA_CLUSTER_SIZE):
+        """Initialize hierarchical pathfinding and build its abstract graph"""
+        self.pathfinding = pathfinding
+        self.map = pathfinding.game.map
+        self.cluster_size = cluster_size
+        # Number of clusters across & down the map
+        self.cols = -(-self.map.cols // cluster_size)
+        self.rows = -(-self.map.rows // cluster_size)
+        # Map cluster borders, as (cluster, dx, dy) towards the next cluster, to
+        # their entrances as (node, node) pairs of tiles facing each other
+        self.entrances = {}
+        # Map entrance nodes to the nodes facing them across cluster borders
+        self.links = {}
+        # Map clusters to the path costs between the entrance nodes inside them
+        self.edges = {}
+        self.build()
+
+    def get_cluster(self, node):
+        """Get the cluster a tile is in"""
+        return node[0] // self.cluster_size, node[1] // self.cluster_size
+
+    def get_bounds(self, cluster):
+        """Get the tiles a cluster covers as (x0, y0, x1, y1), end exclusive"""
+        x0, y0 = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        return (
+            x0,
+            y0,
+            min(x0 + self.cluster_size, self.map.cols),
+            min(y0 + self.cluster_size, self.map.rows),
+        )
+
+    def get_borders(self, cluster):
+        """Get the borders of a cluster with the clusters next to it"""
+        cx, cy = cluster
+        borders = (
+            (cluster, 1, 0),
+            (cluster, 0, 1),
+            ((cx - 1, cy), 1, 0),
+            ((cx, cy - 1), 0, 1),
+        )
+        return [border for border in borders if border in self.entrances]
+
+    def build(self):
+        """Find the entrances of every cluster and the paths between them"""
+        for cy in range(self.rows):
+            for cx in range(self.cols):
+                if cx + 1 < self.cols:
+                    self.find_entrances((cx, cy), 1, 0)
+                if cy + 1 < self.rows:
+                    self.find_entrances((cx, cy), 0, 1)
+        self.link_entrances()
+        for cy in range(self.rows):
+            for cx in range(self.cols):
+                self.connect_cluster((cx, cy))
+
+    def find_entrances(self, cluster, dx, dy):
+        """Find the entrances on the border of a cluster with the next cluster
+        to the right (dx) or below (dy)"""
+        x0, y0, x1, y1 = self.get_bounds(cluster)
+        # Get the pairs of tiles facing each other across the border
+        if dx:
+            pairs = [((x1 - 1, y), (x1, y)) for y in range(y0, y1)]
+        else:
+            pairs = [((x, y1 - 1), (x, y1)) for x in range(x0, x1)]
+        graph = self.pathfinding.graph
+        entrances = []
+        run = []
+        # Split the border into stretches where both sides are open
+        for node, next_node in pairs + [(None, None)]:
+            if node in graph and next_node in graph:
+                run.append((node, next_node))
+                continue
+            if len(run) > self.MAX_SINGLE_ENTRANCE:
+                entrances += run[0], run[-1]
+            elif run:
+                entrances.append(run[len(run) // 2])
+            run = []
+        self.entrances[cluster, dx, dy] = entrances
+
+    def link_entrances(self):
+        """Link the entrance nodes facing each other across borders"""
+        self.links = {}
+        for entrances in self.entrances.values():
+            for node, next_node in entrances:
+                self.links.setdefault(node, []).append(next_node)
+                self.links.setdefault(next_node, []).append(node)
+
+    def get_cluster_nodes(self, cluster):
+        """Get the entrance nodes inside a cluster"""
+        nodes = set()
+        for border in self.get_borders(cluster):
+            # The first node of each pair is on the left or upper side
+            side = 0 if border[0] == cluster else 1
+            nodes.update(pair[side] for pair in self.entrances[border])
+        return nodes
+
+    def search_cluster(self, start, cluster):
+        """Dijkstra search of the weighted graph from start pos without leaving a
+        cluster, returns the cost & previous tile of every tile reached"""
+        graph = self.pathfinding.weighted_graph
+        x0, y0, x1, y1 = self.get_bounds(cluster)
+        queue = [(0, start)]
+        costs = {start: 0}
+        visited = {start: None}
+        expanded = 0
+        while queue:
+            cur_cost, cur_node = heappop(queue)
+            # Skip nodes that were queued again at a lower cost
+            if cur_cost > costs[cur_node]:
+                continue
+            expanded += 1
+            for next_node, step_cost in graph.get(cur_node, ()):
+                cost = cur_cost + step_cost
+                x, y = next_node
+                if (
+                    x0 <= x < x1
+                    and y0 <= y < y1
+                    and cost < costs.get(next_node, math.inf)
+                ):
+                    costs[next_node] = cost
+                    visited[next_node] = cur_node
+                    heappush(queue, (cost, next_node))
+        self.pathfinding.nodes_expanded += expanded
+        return costs, visited
+
+    def connect_cluster(self, cluster):
+        """Find the path costs between the entrance nodes inside a cluster"""
+        nodes = self.get_cluster_nodes(cluster)
+        edges = {}
+        for node in nodes:
+            costs, _ = self.search_cluster(node, cluster)
+            edges[node] = {
+                other: costs[other]
+                for other in nodes
+                if other != node and other in costs
+            }
+        self.edges[cluster] = edges
+
+    def update_tile(self, x, y):
+        """Update the entrances & paths around a map position whose wall has
+        changed"""
+        cx, cy = cluster = self.get_cluster((x, y))
+        for border in self.get_borders(cluster):
+            self.find_entrances(*border)
+        self.link_entrances()
+        # The entrances of the clusters next to it may have changed too
+        for dx, dy in (0, 0), (-1, 0), (1, 0), (0, -1), (0, 1):
+            if 0 <= cx + dx < self.cols and 0 <= cy + dy < self.rows:
+                self.connect_cluster((cx + dx, cy + dy))
+
+    def search_abstract(self, start, goal, start_edges, goal_edges):
+        """A* search of the entrance graph from start pos to end pos, with start
+        & goal linked to the entrances of their clusters, returns the list of
+        nodes on the path or None if the goal can't be reached"""
+        goal_x, goal_y = goal
+        diagonal = DIAGONAL_COST - 1
+        queue = [(0, 0, start)]
+        costs = {start: 0}
+        visited = {start: None}
+        while queue:
+            _, cur_cost, cur_node = heappop(queue)
+            cur_cost = -cur_cost
+            # Skip nodes that were queued again at a lower cost
+            if cur_cost > costs[cur_node]:
+                continue
+            self.pathfinding.nodes_expanded += 1
+            if cur_node == goal:
+                # Walk back from the goal to get the path
+                path = []
+                while cur_node is not None:
+                    path.append(cur_node)
+                    cur_node = visited[cur_node]
+                return path[::-1]
+            # Get the paths inside the node's cluster, then the steps across
+            # borders & to the goal
+            if cur_node == start:
+                edges = start_edges
+            else:
+                edges = self.edges[self.get_cluster(cur_node)].get(cur_node, {})
+            next_nodes = list(edges.items())
+            next_nodes += ((next_node, 1) for next_node in self.links.get(cur_node, ()))
+            if cur_node in goal_edges:
+                next_nodes.append((goal, goal_edges[cur_node]))
+            for next_node, step_cost in next_nodes:
+                cost = cur_cost + step_cost
+                if cost < costs.get(next_node, math.inf):
+                    costs[next_node] = cost
+                    visited[next_node] = cur_node
+                    # Add the octile distance to the goal
+                    dx = abs(next_node[0] - goal_x)
+                    dy = abs(next_node[1] - goal_y)
+                    estimate = cost + (
+                        dx + diagonal * dy if dx > dy else dy + diagonal * dx
+                    )
+                    heappush(queue, (estimate, -cost, next_node))
+        return None
+
+    def find_path(self, start, goal):
+        """Search the abstract path from start pos to end pos, returns it as a
+        list of nodes (None if the goal can't be reached) with the tiles of its
+        first segment refined"""
+        cluster = self.get_cluster(start)
+        start_costs, start_visited = self.search_cluster(start, cluster)
+        # Goals in the start's cluster are found by the local search
+        if goal in start_costs:
+            return [start, goal], self.refine(start_visited, goal)
+        # Link start & goal to the entrances of their clusters
+        start_edges = {
+            node: start_costs[node]
+            for node in self.get_cluster_nodes(cluster)
+            if node in start_costs
+        }
+        goal_cluster = self.get_cluster(goal)
+        goal_costs, _ = self.search_cluster(goal, goal_cluster)
+        goal_edges = {
+            node: goal_costs[node]
+            for node in self.get_cluster_nodes(goal_cluster)
+            if node in goal_costs
+        }
+        path = self.search_abstract(start, goal, start_edges, goal_edges)
+        if path is None:
+            return None, []
+        return path, self.refine(start_visited, path[1])
+
+    @staticmethod
+    def refine(visited, node):
+        """Get the tiles from after the start of a cluster search to a node"""
+        # Nodes outside the searched cluster are a single step across a border
+        if visited.get(node) is None:
+            return [node]
+        tiles = []
+        while visited[node] is not None:
+            tiles.append(node)
+            node = visited[node]
+        return tiles[::-1]
+
+    def get_next_step(self, start, goal):
+        """Get the next step from start pos towards goal pos"""
+        _, tiles = self.find_path(start, goal)
+        # Unreachable goals are headed straight for
+        return tiles[0] if tiles else goal
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """Least recently used cache bounded by the total size of its entries"""
+
+    def __init__(self, max_size):
+        """Initialize cache"""
+        self.max_size = max_size
+        # Map keys to entries, least recently used first
+        self.entries = OrderedDict()
+        # Lock so the cache can be shared by threads
+        self.lock = Lock()
+        # Initialize total size and statistics
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get_size(entry):
+        """Get the size an entry counts for towards the limit, every entry
+        counts once by default"""
+        return 1
+
+    def get(self, key):
+        """Get a cached entry, returns None if the key is not cached"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            # Mark the entry as most recently used
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        """Add an entry to the cache, evicting the least recently used ones"""
+        with self.lock:
+            # Replace the entry if another thread already added it
+            replaced = self.entries.pop(key, None)
+            if replaced is not None:
+                self.size -= self.get_size(replaced)
+            self.entries[key] = entry
+            self.size += self.get_size(entry)
+            # Evict entries until the cache fits in its limit
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.get_size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self):
+        """Fraction of lookups that found a cached entry"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Get the cache statistics"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "items": len(self.entries),
+            "size": self.size,
+        }
@@ -10,6 +10,12 @@ from object_handler import *
 from weapon import *
 from sound import *
 from pathfinding import *
+from profiler import *
+from dynamic_resolution import *
+from asset_pack import *
+from asset_loader import *
+from shading import *
+from visibility import *
 
 
 class Game:
@@ -23,28 +29,63 @@ class Game:
         self.global_trigger = False
         self.global_event = pg.USEREVENT + 0
         pg.time.set_timer(self.global_event, 40)
-        self.new_game()
+        self.profiler = FrameProfiler(self)
+        # decoded images & sounds, kept between games
+        self.assets = AssetPack(ASSET_PACK_PATH if ASSET_PACK else None)
+        # depth shading of walls, sprites & floors
+        self.shading = Shading()
+        # cache of sprite frames & scaled sprites, kept between games
+        self.sprite_cache = SpriteCache(self.assets, self.shading)
+        self.loader = AssetLoader(self)
+        self.dynamic_resolution = DynamicResolution(self)
+        self.load_game()
+
+    def load_game(self):
+        """Load the assets & create the game objects"""
+        # create map, player, object renderer, raycaster, object handler,
+        # weapon, sound, pathfinder & visibility table while showing the
+        # loading progress
+        self.loader.load(
+            [
+                ("map", Map),
+                ("player", Player),
+                ("object_renderer", ObjectRenderer),
+                ("raycasting", RayCasting),
+                ("object_handler", ObjectHandler),
+                ("weapon", Weapon),
+                ("sound", Sound),
+                ("pathfinding", PathFinding),
+                ("visibility", VisibilityTable),
+            ]
+        )
+        # keep the resolution chosen by dynamic resolution
+        if DYNAMIC_RESOLUTION:
+            self.dynamic_resolution.apply()
+        # pack any assets that were decoded from their source files
+        self.assets.save()
+        self.start_game()
 
     def new_game(self):
-        """Game initialization"""
+        """Start a new game, keeping the loaded assets & engine"""
         # create new map
         self.map = Map(self)
-        # create new player
-        self.player = Player(self)
-        # create new object renderer
-        self.object_renderer = ObjectRenderer(self)
-        # create new raycaster
-        self.raycasting = RayCasting(self)
-        # create new object handler
+        # reset player & weapon
+        self.player.reset()
+        self.weapon.reset()
+        # the map has been recreated, so cast all rays & search paths again,
+        # building the pathfinding graph again only if the walls differ
+        self.raycasting.invalidate()
+        self.pathfinding.load_map()
+        # create new sprites & npcs
         self.object_handler = ObjectHandler(self)
-        # create new weapon
-        self.weapon = Weapon(self)
-        # create new sound
-        self.sound = Sound(self)
-        # create new pathfinder
-        self.pathfinding = PathFinding(self)
+        self.start_game()
+
+    def start_game(self):
+        """Start playing the game"""
         # play theme music
         pg.mixer.music.play(-1)
+        # instrument the new game objects if the profiler is on
+        self.profiler.reset()
 
     def update(self):
         """Update everything in the game"""
@@ -59,6 +100,9 @@ class Game:
         pg.display.flip()
         # set delta time
         self.delta_time = self.clock.tick(FPS)
+        # adjust resolution to the frame time
+        if DYNAMIC_RESOLUTION:
+            self.dynamic_resolution.update()
         # Display fps in window title
         pg.display.set_caption(f"{self.clock.get_fps() :.1f}")
 
@@ -70,6 +114,10 @@ class Game:
         self.weapon.draw()
         # draw minimap
         self.map.draw_minimap()
+        # draw profiler overlay
+        if self.profiler.enabled:
+            self.profiler.end_frame()
+            self.profiler.draw()
 
     def check_events(self):
         """Check for events"""
@@ -86,6 +134,9 @@ class Game:
             # Trigger global event
             elif event.type == self.global_event:
                 self.global_trigger = True
+            # Toggle profiler overlay
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.profiler.toggle()
             # Trigger player shot event
             self.player.single_fire_event(event)
 
@@ -1,4 +1,6 @@
 import pygame as pg
+import numpy as np
+from settings import *
 
 _ = False
 mini_map = [
@@ -40,14 +42,28 @@ mini_map = [
 class Map:
     """Class for the map"""
 
-    def __init__(self, game):
-        """Initialize the map"""
+    def __init__(self, game, mini_map=mini_map):
+        """Initialize the map, from a grid of wall textures (0 or False for empty
+        tiles)"""
         self.game = game
         self.mini_map = mini_map
         self.world_map = {}
         self.rows = len(self.mini_map)
         self.cols = len(self.mini_map[0])
+        # Flat row-major buffer of wall textures, 0 for empty tiles
+        self.tiles = bytearray(self.rows * self.cols)
+        # 2D view of the tile buffer indexed by [y, x]
+        self.grid = np.frombuffer(self.tiles, dtype=np.uint8).reshape(
+            self.rows, self.cols
+        )
+        # Number of times the map has changed
+        self.version = 0
         self.get_map()
+        # Initialize the minimap, drawn once when it is first needed
+        self.minimap = None
+        # Tiles the player has been near, for the fog of war
+        self.explored = np.zeros((self.rows, self.cols), dtype=bool)
+        self.explored_minimap = None
 
     def get_map(self):
         """Get the map"""
@@ -55,6 +71,30 @@ class Map:
             for i, value in enumerate(row):
                 if value:
                     self.world_map[(i, j)] = value
+                    self.tiles[j * self.cols + i] = value
+
+    def set_tile(self, x, y, value):
+        """Set the wall texture at a map position, 0 to remove the wall"""
+        if value:
+            self.world_map[(x, y)] = value
+        else:
+            self.world_map.pop((x, y), None)
+        self.tiles[y * self.cols + x] = value
+        self.version += 1
+        # Redraw the tile on the minimap
+        if self.minimap is not None:
+            self.draw_minimap_tile(x, y)
+        # The walls have changed, so cast all rays & search paths again
+        self.game.raycasting.invalidate()
+        self.game.pathfinding.update_tile(x, y)
+
+    def is_wall(self, x, y):
+        """Check if there is a wall at a map position"""
+        return (
+            0 <= x < self.cols
+            and 0 <= y < self.rows
+            and self.tiles[y * self.cols + x] > 0
+        )
 
     def draw(self):
         """Draw untextured map"""
@@ -65,40 +105,81 @@ class Map:
             for pos in self.world_map
         ]
 
+    def get_minimap(self):
+        """Get the minimap surface, drawing it if the map has not been drawn yet"""
+        if self.minimap is None:
+            # Draw the background
+            self.minimap = pg.Surface(
+                (self.cols * MINIMAP_SCALE, self.rows * MINIMAP_SCALE)
+            )
+            self.minimap.fill((50, 50, 50))
+            # Draw the map tiles
+            for x, y in self.world_map:
+                self.draw_minimap_tile(x, y)
+            # Draw the explored tiles on top of the fog of war
+            if MINIMAP_FOG_OF_WAR:
+                self.explored_minimap = pg.Surface(self.minimap.get_size())
+                self.explored_minimap.fill("black")
+                for y, x in np.argwhere(self.explored).tolist():
+                    self.draw_explored_tile(x, y)
+        return self.explored_minimap if MINIMAP_FOG_OF_WAR else self.minimap
+
+    def draw_minimap_tile(self, x, y):
+        """Draw a tile on the minimap"""
+        rect = (x * MINIMAP_SCALE, y * MINIMAP_SCALE, MINIMAP_SCALE, MINIMAP_SCALE)
+        self.minimap.fill((50, 50, 50), rect)
+        if self.is_wall(x, y):
+            pg.draw.rect(self.minimap, "darkgray", rect, 2)
+        if self.explored_minimap is not None and self.explored[y, x]:
+            self.draw_explored_tile(x, y)
+
+    def draw_explored_tile(self, x, y):
+        """Copy a tile of the minimap to the explored part of the minimap"""
+        rect = (x * MINIMAP_SCALE, y * MINIMAP_SCALE, MINIMAP_SCALE, MINIMAP_SCALE)
+        self.explored_minimap.blit(self.minimap, rect[:2], rect)
+
+    def explore(self, x, y, radius=MINIMAP_REVEAL_RADIUS):
+        """Reveal the tiles of the minimap around a map position"""
+        # Get the tiles within the radius that have not been explored yet
+        top, left = max(y - radius, 0), max(x - radius, 0)
+        bottom, right = min(y + radius + 1, self.rows), min(x + radius + 1, self.cols)
+        rows, cols = np.ogrid[top:bottom, left:right]
+        area = self.explored[top:bottom, left:right]
+        revealed = ((rows - y) ** 2 + (cols - x) ** 2 <= radius**2) & ~area
+        if not revealed.any():
+            return
+        area |= revealed
+        # Only draw the newly revealed tiles
+        if self.explored_minimap is not None:
+            for j, i in np.argwhere(revealed).tolist():
+                self.draw_explored_tile(left + i, top + j)
+
     # Draw minimap
     def draw_minimap(self):
-        # Set scale offset and size
-        mini_map_scale = 8  # Adjust the scale as needed
-        mini_map_offset = (self.game.screen.get_width() - self.cols * mini_map_scale, 0)
-        mini_map_size = (self.cols * mini_map_scale, self.rows * mini_map_scale)
-
-        # Draw the background rectangle
-        pg.draw.rect(
-            self.game.screen,
-            (50, 50, 50),
-            (
-                mini_map_offset[0],
-                mini_map_offset[1],
-                mini_map_size[0],
-                mini_map_size[1],
-            ),
-        )
+        # Set offset of the minimap in the top right corner of the screen
+        mini_map_offset = (self.game.screen.get_width() - self.cols * MINIMAP_SCALE, 0)
 
-        # Draw the map tiles
-        for pos, value in self.world_map.items():
-            mini_map_x = pos[0] * mini_map_scale + mini_map_offset[0]
-            mini_map_y = pos[1] * mini_map_scale + mini_map_offset[1]
-            pg.draw.rect(
-                self.game.screen,
-                "darkgray",
-                (mini_map_x, mini_map_y, mini_map_scale, mini_map_scale),
-                2,
-            )
+        # Reveal the tiles around the player
+        player = self.game.player
+        if MINIMAP_FOG_OF_WAR:
+            self.explore(*player.map_pos)
+
+        # Draw the map
+        self.game.screen.blit(self.get_minimap(), mini_map_offset)
+
+        # Draw the npc markers on the mini-map
+        for npc in self.game.object_handler.npc_list:
+            x, y = npc.map_pos
+            if npc.alive and (not MINIMAP_FOG_OF_WAR or self.explored[y, x]):
+                npc_mini_map_x = int(npc.x * MINIMAP_SCALE) + mini_map_offset[0]
+                npc_mini_map_y = int(npc.y * MINIMAP_SCALE) + mini_map_offset[1]
+                pg.draw.circle(
+                    self.game.screen, "orange", (npc_mini_map_x, npc_mini_map_y), 2
+                )
 
         # Draw the player marker on the mini-map
-        player = self.game.player
-        player_mini_map_x = int(player.x * mini_map_scale) + mini_map_offset[0]
-        player_mini_map_y = int(player.y * mini_map_scale) + mini_map_offset[1]
+        player_mini_map_x = int(player.x * MINIMAP_SCALE) + mini_map_offset[0]
+        player_mini_map_y = int(player.y * MINIMAP_SCALE) + mini_map_offset[1]
         pg.draw.circle(
             self.game.screen, (255, 0, 0), (player_mini_map_x, player_mini_map_y), 3
         )
@@ -52,17 +52,21 @@ class NPC(AnimatedSprite):
 
     def update(self):
         """Update the npc"""
-        # Check if the animation time has passed
-        self.check_animation_time()
         # Get npc sprite
         self.get_sprite()
+        self.update_state()
+
+    def update_state(self):
+        """Update the npc, apart from its projection"""
+        # Check if the animation time has passed
+        self.check_animation_time()
         # Run npc logic
         self.run_logic()
         # self.draw_ray_cast()
 
     def check_wall(self, x, y):
         """Check if the specified position is a wall"""
-        return (x, y) not in self.game.map.world_map
+        return not self.game.map.is_wall(x, y)
 
     def check_wall_collision(self, dx, dy):
         """Check if npc is colliding with a wall"""
@@ -111,12 +115,10 @@ class NPC(AnimatedSprite):
                 self.game.global_trigger
                 and self.frame_counter < len(self.death_images) - 1
             ):
-                # Rotate the npc death images
-                self.death_images.rotate(-1)
-                # Update the current npc image
-                self.image = self.death_images[0]
                 # Increment the frame counter
                 self.frame_counter += 1
+                # Update the current npc image
+                self.image = self.death_images[self.frame_counter]
 
     def animate_pain(self):
         """Animate the npc being damaged"""
@@ -214,6 +216,13 @@ class NPC(AnimatedSprite):
         if self.game.player.map_pos == self.map_pos:
             # Return true
             return True
+        # Look the tiles up in the visibility table
+        visible = self.game.visibility.is_visible(
+            self.game.player.map_pos, self.map_pos
+        )
+        # Only cast the ray if the tiles can partly see each other
+        if visible is not None:
+            return visible
 
         # Initialize the player & wall verticals and horizontals
         wall_dist_v, wall_dist_h = 0, 0
@@ -226,8 +235,9 @@ class NPC(AnimatedSprite):
         # Set the ray angle to the npc's angle
         ray_angle = self.theta
 
-        sin_a = math.sin(ray_angle)
-        cos_a = math.cos(ray_angle)
+        # Avoid dividing by zero for rays along the grid lines
+        sin_a = math.sin(ray_angle) or 1e-6
+        cos_a = math.cos(ray_angle) or 1e-6
 
         ### horizontals ###
         # Initialize the horizontal y coordinate and delta y
@@ -1,6 +1,7 @@
 from sprite_object import *
 from npc import *
 from random import choices, randrange
+import numpy as np
 
 
 class ObjectHandler:
@@ -18,6 +19,10 @@ class ObjectHandler:
         add_npc = self.add_npc
         # Create a dictionary for npc positions
         self.npc_positions = {}
+        # Count changes to the npc positions, so searches know when to run again
+        self.occupancy_version = 0
+        # Initialize the arrays used to project all sprites at once
+        self.sprite_arrays = None
 
         ### Add NPCs ###
         # Number of enemies to spawn
@@ -101,7 +106,7 @@ class ObjectHandler:
             # Choose a random position for the npc
             pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
             # Make sure the npc is not spawned in the restricted area or outside the map
-            while (pos in self.game.map.world_map) or (pos in self.restricted_area):
+            while self.game.map.is_wall(x, y) or (pos in self.restricted_area):
                 pos = x, y = randrange(self.game.map.cols), randrange(
                     self.game.map.rows
                 )
@@ -123,17 +128,86 @@ class ObjectHandler:
     def update(self):
         """Update all sprites and npcs"""
         # Update the npc positions
-        self.npc_positions = {npc.map_pos for npc in self.npc_list if npc.alive}
+        npc_positions = {npc.map_pos for npc in self.npc_list if npc.alive}
+        if npc_positions != self.npc_positions:
+            self.npc_positions = npc_positions
+            self.occupancy_version += 1
+        # Project all sprites and npcs
+        self.project_sprites()
         # Update all sprites and npcs
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        [sprite.update_state() for sprite in self.sprite_list]
+        [npc.update_state() for npc in self.npc_list]
         # Check if the player has won
         self.check_win()
 
+    def get_sprite_arrays(self):
+        """Get all sprites and npcs with arrays of their positions and half widths"""
+        if self.sprite_arrays is None:
+            sprites = self.sprite_list + self.npc_list
+            positions = np.array([(sprite.x, sprite.y) for sprite in sprites])
+            half_widths = np.array([sprite.IMAGE_HALF_WIDTH for sprite in sprites])
+            self.sprite_arrays = sprites, positions.reshape(-1, 2), half_widths
+        return self.sprite_arrays
+
+    def project_sprites(self):
+        """Get the projection attributes of all sprites and npcs at once"""
+        sprites, positions, half_widths = self.get_sprite_arrays()
+        num_sprites = len(self.sprite_list)
+        # Update the positions of the npcs, as they move
+        if self.npc_list:
+            positions[num_sprites:] = [(npc.x, npc.y) for npc in self.npc_list]
+
+        # Calculate the sprite projection based on angle to player
+        player = self.game.player
+        dx = positions[:, 0] - player.x
+        dy = positions[:, 1] - player.y
+        theta = np.arctan2(dy, dx)
+        # Normalize the difference between player angle and sprite angle
+        delta = theta - player.angle
+        delta[((dx > 0) & (player.angle > math.pi)) | ((dx < 0) & (dy < 0))] += math.tau
+        screen_x = (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE
+        dist = np.hypot(dx, dy)
+        norm_dist = dist * np.cos(delta)
+
+        # Check which sprites are within the player's FOV
+        visible = (
+            (-half_widths < screen_x)
+            & (screen_x < WIDTH + half_widths)
+            & (norm_dist > 0.5)
+        )
+        # Write back the attributes of visible sprites and of all npcs, as npc
+        # logic uses them even when the npc is not visible
+        write_back = visible.copy()
+        write_back[num_sprites:] = True
+        indices = np.flatnonzero(write_back)
+        for i, *attributes in zip(
+            indices.tolist(),
+            *(
+                values[indices].tolist()
+                for values in (dx, dy, theta, screen_x, dist, norm_dist)
+            ),
+        ):
+            sprite = sprites[i]
+            (
+                sprite.dx,
+                sprite.dy,
+                sprite.theta,
+                sprite.screen_x,
+                sprite.dist,
+                sprite.norm_dist,
+            ) = attributes
+        # Get the projections of the visible sprites
+        for i in np.flatnonzero(visible).tolist():
+            sprites[i].get_sprite_projection()
+
     def add_npc(self, npc):
         """Add npc to the npc list"""
         self.npc_list.append(npc)
+        # Rebuild the sprite arrays on the next projection
+        self.sprite_arrays = None
 
     def add_sprite(self, sprite):
         """Add sprite to the sprite list"""
         self.sprite_list.append(sprite)
+        # Rebuild the sprite arrays on the next projection
+        self.sprite_arrays = None
@@ -1,4 +1,5 @@
 import pygame as pg
+import numpy as np
 from settings import *
 
 
@@ -9,14 +10,28 @@ class ObjectRenderer:
         """Initialize object renderer"""
         self.game = game
         self.screen = game.screen
+        self.shading = game.shading
+        # Set render target of the background & walls
+        self.frame = self.get_frame()
         # Load wall textures
         self.wall_textures = self.load_wall_textures()
+        # Get wall texture pixels for the framebuffer render mode
+        if WALL_RENDER_MODE == "framebuffer":
+            self.wall_pixels = self.get_wall_pixels()
+            # Screen row indices as a column vector
+            self.screen_rows = np.arange(HEIGHT, dtype=np.int32)[:, None]
         # Load sky image
         self.sky_image = self.get_texture(
             "resources/textures/sky.png", (WIDTH, HALF_HEIGHT)
         )
         # Initialize sky offset
         self.sky_offset = 0
+        # Set the wall textures cast onto the floor & ceiling
+        self.floor_texture = FLOOR_TEXTURE
+        self.ceiling_texture = CEILING_TEXTURE
+        # Map wall textures to their pixels for floor & ceiling casting
+        self.floor_pixels = {}
+        self.set_floor_scale(FLOOR_RESOLUTION_SCALE)
         # Load blood screen image
         self.blood_screen = self.get_texture("resources/textures/blood_screen.png", RES)
         # Set digit size
@@ -34,10 +49,24 @@ class ObjectRenderer:
         self.game_over_image = self.get_texture("resources/textures/game_over.png", RES)
         self.win_image = self.get_texture("resources/textures/win.png", RES)
 
+    def get_frame(self):
+        """Get the surface the background and walls are drawn to"""
+        # Framebuffer rendering writes 32 bit pixels, so draw to an offscreen
+        # target if the screen uses a different pixel format
+        if WALL_RENDER_MODE == "framebuffer" and self.screen.get_bitsize() != 32:
+            return pg.Surface(RES, depth=32)
+        return self.screen
+
     def draw(self):
         """Draw the game objects"""
         # Draw the background
         self.draw_background()
+        if WALL_RENDER_MODE == "framebuffer":
+            # Draw the walls straight into the frame's pixels
+            self.draw_walls()
+            # Copy the offscreen frame to the screen
+            if self.frame is not self.screen:
+                self.screen.blit(self.frame, (0, 0))
         # Draw the game objects
         self.render_game_objects()
         # Draw the player health
@@ -67,28 +96,160 @@ class ObjectRenderer:
         # Set sky offset based on player position & screen width
         self.sky_offset = (self.sky_offset + 4.5 * self.game.player.rel) % WIDTH
         # Draw sky box
-        self.screen.blit(self.sky_image, (-self.sky_offset, 0))
-        self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
+        if self.ceiling_texture is None:
+            self.frame.blit(self.sky_image, (-self.sky_offset, 0))
+            self.frame.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
         # Draw the floor using solid rectangles
-        pg.draw.rect(self.screen, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
+        if self.floor_texture is None:
+            pg.draw.rect(self.frame, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
+        # Draw the textured floor & ceiling
+        if self.floor_texture is not None or self.ceiling_texture is not None:
+            self.draw_floor()
+
+    def set_floor_scale(self, scale):
+        """Set the width & height in screen pixels of each cast floor pixel"""
+        self.floor_scale = scale
+        cols, rows = -(-WIDTH // scale), -(-HALF_HEIGHT // scale)
+        # Get the angle of the ray through each column, relative to the player
+        # angle, the same way the walls are cast
+        x = (np.arange(cols) + 0.5) * scale
+        angles = x * FOV / WIDTH - HALF_FOV
+        self.floor_angles = angles
+        # Scale ray directions so the depth is measured along the view direction
+        self.floor_direction_scale = 1 / np.cos(angles)
+        # Get the depth of the floor at each row below the horizon, walls of
+        # height 1 at that depth end at that row
+        y = (np.arange(rows) + 0.5) * scale
+        self.floor_depths = (SCREEN_DIST / 2 / y)[:, None].astype(np.float32)
+        # Get the offset of each row's brightness level in the floor pixels
+        self.floor_levels = (
+            self.shading.get_levels(self.floor_depths) * TEXTURE_SIZE * TEXTURE_SIZE
+        )
+        # Cast the ceiling (mirrored) above the floor into a small surface that
+        # is scaled to the screen
+        self.floor_surface = pg.Surface((cols, rows * 2), depth=32)
+        self.floor_image = pg.Surface(RES, depth=32)
+        # Cast again on the next draw
+        self.floor_pixels.clear()
+        self.floor_camera = None
+
+    def get_floor_pixels(self, texture):
+        """Get the pixels of a wall texture at every brightness level as a flat
+        array indexed by texel"""
+        pixels = self.floor_pixels.get(texture)
+        if pixels is None:
+            pixels = self.floor_pixels[texture] = self.shading.get_shaded_pixels(
+                self.wall_textures[texture], self.floor_surface
+            ).ravel()
+        return pixels
+
+    def draw_floor(self):
+        """Draw the textured floor & ceiling by casting the screen rows"""
+        player = self.game.player
+        camera = player.pos, player.angle, self.floor_texture, self.ceiling_texture
+        # A still camera sees the same floor as last frame
+        if camera != self.floor_camera:
+            self.floor_camera = camera
+            # Get the direction of the ray through each column
+            angles = player.angle + self.floor_angles
+            dx = (np.cos(angles) * self.floor_direction_scale * TEXTURE_SIZE).astype(
+                np.float32
+            )
+            dy = (np.sin(angles) * self.floor_direction_scale * TEXTURE_SIZE).astype(
+                np.float32
+            )
+            # Get the world position of the floor at each row & column in texels
+            x = self.floor_depths * dx
+            x += player.x * TEXTURE_SIZE
+            y = self.floor_depths * dy
+            y += player.y * TEXTURE_SIZE
+            # Get the texel of each world position (the texture size is a power of 2)
+            texels = x.astype(np.int32)
+            texels &= TEXTURE_SIZE - 1
+            texels *= TEXTURE_SIZE
+            texels += y.astype(np.int32) & (TEXTURE_SIZE - 1)
+            # Darken rows by their depth
+            if self.shading.levels:
+                texels += self.floor_levels
+
+            # Write the floor & ceiling pixels, indexed by [y, x]
+            pixels = pg.surfarray.pixels2d(self.floor_surface).T
+            rows = len(self.floor_depths)
+            if self.ceiling_texture is not None:
+                # The ceiling is the floor mirrored about the horizon
+                pixels[:rows] = self.get_floor_pixels(self.ceiling_texture).take(
+                    texels[::-1]
+                )
+            if self.floor_texture is not None:
+                pixels[rows:] = self.get_floor_pixels(self.floor_texture).take(texels)
+            # Unlock the surface
+            del pixels
+            # Scale the cast pixels to the screen
+            pg.transform.scale(self.floor_surface, RES, self.floor_image)
+
+        # Draw the textured halves of the screen
+        if self.ceiling_texture is not None:
+            self.frame.blit(self.floor_image, (0, 0), (0, 0, WIDTH, HALF_HEIGHT))
+        if self.floor_texture is not None:
+            self.frame.blit(
+                self.floor_image, (0, HALF_HEIGHT), (0, HALF_HEIGHT, WIDTH, HALF_HEIGHT)
+            )
+
+    def draw_walls(self):
+        """Draw textured walls straight into the frame's pixels"""
+        scale = self.game.raycasting.scale
+        # Get ray casting result as arrays
+        depth, proj_height, texture, offset = self.game.raycasting.projection
+        proj_height = np.maximum(proj_height.astype(np.int32), 1)
+        wall_top = HALF_HEIGHT - proj_height // 2
+        # Only draw the screen rows covered by the tallest wall
+        first_row = max(int(wall_top.min()), 0)
+        last_row = min(int((wall_top + proj_height).max()), HEIGHT)
+        screen_rows = self.screen_rows[first_row:last_row]
+        # Get the texture row of every screen row in every ray column
+        texture_rows = (screen_rows - wall_top) * TEXTURE_SIZE // proj_height
+        # Only screen rows inside the wall are drawn
+        is_wall = (texture_rows >= 0) & (texture_rows < TEXTURE_SIZE)
+        texture_rows = texture_rows.clip(0, TEXTURE_SIZE - 1)
+        # Get the index of the first texel of each ray's texture column
+        texture_column = (offset * (TEXTURE_SIZE - scale)).astype(np.int32)
+        column_start = (
+            texture.astype(np.int32) * TEXTURE_SIZE + texture_column
+        ) * TEXTURE_SIZE
+        # Darken walls by their depth
+        if self.shading.levels:
+            column_start += self.shading.get_levels(depth) * self.wall_level_size
+        # Get the frame's pixels indexed by [y, x]
+        pixels = pg.surfarray.pixels2d(self.frame).T[first_row:last_row]
+        # Write each of the screen columns covered by a ray
+        for i in range(scale):
+            columns = pixels[:, i::scale]
+            # The last ray may only partly cover the screen
+            rays = columns.shape[1]
+            texels = self.wall_pixels.take(column_start[:rays] + texture_rows[:, :rays])
+            np.copyto(columns, texels, where=is_wall[:, :rays])
+            column_start += TEXTURE_SIZE
+        # Unlock the frame
+        del pixels
+
+    def sort_game_objects(self):
+        """Sort objects to render from back to front"""
+        return sorted(
+            self.game.raycasting.objects_to_render, key=lambda t: t[0], reverse=True
+        )
 
     def render_game_objects(self):
         """Render game objects to the screen"""
         # Sort objects to render by depth
-        list_objects = sorted(
-            self.game.raycasting.objects_to_render, key=lambda t: t[0], reverse=True
-        )
+        list_objects = self.sort_game_objects()
         # Draw objects to screen
         for depth, image, pos in list_objects:
             self.screen.blit(image, pos)
 
-    @staticmethod
-    def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
+    def get_texture(self, path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
         """Get a texture from a file"""
-        # Load the texture
-        texture = pg.image.load(path).convert_alpha()
-        # Scale the texture and return it
-        return pg.transform.scale(texture, res)
+        # Load the texture scaled to its resolution
+        return self.game.assets.load_image(path, res)
 
     def load_wall_textures(self):
         """Load wall textures"""
@@ -100,3 +261,35 @@ class ObjectRenderer:
             4: self.get_texture("resources/textures/4.png"),
             5: self.get_texture("resources/textures/5.png"),
         }
+
+    def get_wall_pixels(self):
+        """Get the pixels of all wall textures at every brightness level as a flat
+        array indexed by texel"""
+        # Create array of texture pixels indexed by [level, texture, x, y]
+        wall_pixels = np.zeros(
+            (
+                self.shading.count,
+                max(self.wall_textures) + 1,
+                TEXTURE_SIZE,
+                TEXTURE_SIZE,
+            ),
+            dtype=np.uint32,
+        )
+        for texture, image in self.wall_textures.items():
+            # Map texture pixels to the pixel format of the frame
+            wall_pixels[:, texture] = self.shading.get_shaded_pixels(image, self.frame)
+        # Number of texels of each brightness level
+        self.wall_level_size = wall_pixels[0].size
+        return wall_pixels.ravel()
+
+    def set_shading(self, levels):
+        """Set the number of distance shading levels, 0 to turn shading off"""
+        self.shading.set_levels(levels)
+        # Shade the wall & floor pixels again
+        if WALL_RENDER_MODE == "framebuffer":
+            self.wall_pixels = self.get_wall_pixels()
+        self.set_floor_scale(self.floor_scale)
+        # Drop the columns & sprites shaded at the old levels
+        self.game.raycasting.column_cache.clear()
+        self.game.sprite_cache.cache.clear()
+        self.game.raycasting.invalidate()
@@ -1,5 +1,15 @@
 from collections import deque
-from functools import lru_cache
+from heapq import heappop, heappush
+from lru_cache import LRUCache
+from hierarchical_pathfinding import *
+
+
+class PathCache(LRUCache):
+    """Least recently used cache of paths bounded by the number of paths"""
+
+    def __init__(self, max_size=PATH_CACHE_SIZE):
+        """Initialize path cache"""
+        super().__init__(max_size)
 
 
 class PathFinding:
@@ -8,15 +18,50 @@ class PathFinding:
     def __init__(self, game):
         """Initialize pathfinding class"""
         self.game = game
-        self.map = game.map.mini_map
         self.ways = [-1, 0], [0, -1], [1, 0], [0, 1], [-1, -1], [1, -1], [1, 1], [-1, 1]
-        self.graph = {}
-        self.get_graph()
+        # Cache of paths found by bfs
+        self.cache = PathCache()
+        # Count nodes expanded by searches
+        self.nodes_expanded = 0
+        self.mode = PATHFINDING_MODE
+        # Map tiles to their next step towards the goal of the flow field
+        self.flow_field = {}
+        # Goal & npc occupancy the flow field was searched for
+        self.flow_key = None
+        # Map the graph was built from, set_tile keeps the graph in step with
+        # its walls
+        self.map = None
+        self.load_map()
 
-    @lru_cache  # cache the paths so they are only calculated once
     def get_path(self, start, goal):
+        """Get the next step from start pos towards goal pos"""
+        if self.mode == "flow_field":
+            return self.get_flow_step(start, goal)
+        return self.get_cached_path(start, goal)
+
+    def get_cached_path(self, start, goal):
         """Get path from start pos to end pos"""
-        self.visited = self.bfs(start, goal, self.graph)
+        # Paths found before the walls changed, or while npcs were on other
+        # tiles for the searches that avoid npcs, may be blocked now
+        occupancy = None
+        if self.mode != "hpa":
+            occupancy = self.game.object_handler.occupancy_version
+        key = self.mode, start, goal, occupancy, self.game.map.version
+        step = self.cache.get(key)
+        if step is None:
+            step = self.find_path(start, goal)
+            self.cache.put(key, step)
+        return step
+
+    def find_path(self, start, goal, mode=None):
+        """Search the path from start pos to end pos"""
+        mode = mode or self.mode
+        if mode == "hpa":
+            return self.get_hierarchical().get_next_step(start, goal)
+        if mode == "astar":
+            self.visited = self.astar(start, goal, self.weighted_graph)
+        else:
+            self.visited = self.bfs(start, goal, self.graph)
         path = [goal]
         step = self.visited.get(goal, start)
 
@@ -39,6 +84,7 @@ class PathFinding:
         while queue:
             # Pop the first node
             cur_node = queue.popleft()
+            self.nodes_expanded += 1
             # If the node is the goal, break
             if cur_node == goal:
                 break
@@ -58,6 +104,144 @@ class PathFinding:
         # Return visited nodes (Path to goal)
         return visited
 
+    @staticmethod
+    def heuristic(node, goal):
+        """Octile distance between two nodes, the cost of the shortest path on an
+        empty grid"""
+        dx, dy = abs(node[0] - goal[0]), abs(node[1] - goal[1])
+        return max(dx, dy) + (DIAGONAL_COST - 1) * min(dx, dy)
+
+    def astar(self, start, goal, graph):
+        """A* search of weighted graph of map grid"""
+        npc_positions = self.game.object_handler.npc_positions
+        goal_x, goal_y = goal
+        diagonal = DIAGONAL_COST - 1
+        # Create a priority queue of nodes to visit by estimated path cost, then
+        # nodes furthest along their path first
+        queue = [(self.heuristic(start, goal), 0, start)]
+        # Create dictionaries of visited nodes & the cost of reaching them
+        visited = {start: None}
+        costs = {start: 0}
+        # While there are nodes to visit
+        while queue:
+            # Pop the node with the lowest estimated path cost
+            _, cur_cost, cur_node = heappop(queue)
+            cur_cost = -cur_cost
+            # Skip nodes that were queued again at a lower cost
+            if cur_cost > costs[cur_node]:
+                continue
+            self.nodes_expanded += 1
+            # If the node is the goal, break
+            if cur_node == goal:
+                break
+            # For each next node & the cost of stepping to it
+            for next_node, step_cost in graph[cur_node]:
+                cost = cur_cost + step_cost
+                # If the node is reached more cheaply & isn't occupied by an npc
+                if (
+                    cost < costs.get(next_node, math.inf)
+                    and next_node not in npc_positions
+                ):
+                    costs[next_node] = cost
+                    visited[next_node] = cur_node
+                    # Add the octile distance to the goal (inlined heuristic)
+                    dx = abs(next_node[0] - goal_x)
+                    dy = abs(next_node[1] - goal_y)
+                    estimate = cost + (
+                        dx + diagonal * dy if dx > dy else dy + diagonal * dx
+                    )
+                    heappush(queue, (estimate, -cost, next_node))
+        # Return visited nodes (Path to goal)
+        return visited
+
+    def get_flow_step(self, start, goal):
+        """Get the next step from start pos towards goal pos from the flow field"""
+        # Search again when the goal has moved or npcs have changed tiles
+        key = goal, self.game.object_handler.occupancy_version
+        if key != self.flow_key:
+            self.flow_key = key
+            self.flow_field = self.flow_search(goal, self.graph)
+        # Unreachable tiles (and the goal itself) head straight for the goal
+        return self.flow_field.get(start) or goal
+
+    def flow_search(self, goal, graph):
+        """Breadth-first search of graph of map grid outward from the goal"""
+        npc_positions = self.game.object_handler.npc_positions
+        # Create a queue of nodes to visit
+        queue = deque([goal])
+        # Create a dictionary of visited nodes & their next step to the goal
+        field = {goal: None}
+        # While there are nodes to visit
+        while queue:
+            # Pop the first node
+            cur_node = queue.popleft()
+            self.nodes_expanded += 1
+            # For each next node
+            for next_node in graph.get(cur_node, ()):
+                # If the node has not been visited
+                if next_node not in field:
+                    # Npcs step from their tile to the node it was reached from
+                    field[next_node] = cur_node
+                    # But other npcs can't path through an occupied tile
+                    if next_node not in npc_positions:
+                        queue.append(next_node)
+        return field
+
+    def invalidate(self):
+        """Drop the cached paths and search the flow field again on the next
+        query"""
+        self.cache.clear()
+        self.flow_key = None
+
+    def load_map(self):
+        """Build the graph of the game's map, unless it has the same walls as the
+        map the graph was built from"""
+        game_map = self.game.map
+        # Restarting on the same walls keeps the graphs & only drops the paths
+        if self.map is not None and (self.map.cols, self.map.tiles) == (
+            game_map.cols,
+            game_map.tiles,
+        ):
+            self.map = game_map
+            if self.hierarchical is not None:
+                self.hierarchical.map = game_map
+            self.invalidate()
+            return
+        self.map = game_map
+        self.graph = {}
+        # Graph with step costs & without corner cutting, searched by A*
+        self.weighted_graph = {}
+        self.get_graph()
+        # Build the hierarchical graph while loading rather than on the first
+        # path query, other modes only build it if it's asked for
+        self.hierarchical = None
+        if self.mode == "hpa":
+            self.get_hierarchical()
+        self.invalidate()
+
+    def get_hierarchical(self):
+        """Get the hierarchical pathfinding of the map, building it if needed"""
+        if self.hierarchical is None:
+            self.hierarchical = HierarchicalPathFinding(self)
+        return self.hierarchical
+
+    def update_tile(self, x, y):
+        """Update the graph around a map position whose wall has changed"""
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                node = x + dx, y + dy
+                # Walls aren't part of the graph
+                if self.game.map.is_wall(*node):
+                    self.graph.pop(node, None)
+                    self.weighted_graph.pop(node, None)
+                # Floor tiles link to their neighbours that aren't walls
+                elif node in self.graph or (dx, dy) == (0, 0):
+                    self.graph[node] = self.get_next_nodes(*node)
+                    self.weighted_graph[node] = self.get_weighted_nodes(*node)
+        if self.hierarchical is not None:
+            self.hierarchical.update_tile(x, y)
+        self.invalidate()
+
     def get_next_nodes(self, x, y):
         """Get next possible nodes"""
         return [
@@ -65,16 +249,29 @@ class PathFinding:
             # that are not valid (walls, out of bounds, npc positions)
             (x + dx, y + dy)
             for dx, dy in self.ways
-            if (x + dx, y + dy) not in self.game.map.world_map
+            if not self.game.map.is_wall(x + dx, y + dy)
+        ]
+
+    def get_weighted_nodes(self, x, y):
+        """Get next possible nodes & the cost of stepping to them, without
+        cutting wall corners"""
+        is_wall = self.game.map.is_wall
+        return [
+            ((x + dx, y + dy), DIAGONAL_COST if dx and dy else 1)
+            for dx, dy in self.ways
+            if not is_wall(x + dx, y + dy)
+            # Diagonal steps need both tiles beside the corner to be open
+            and not (dx and dy and (is_wall(x + dx, y) or is_wall(x, y + dy)))
         ]
 
     def get_graph(self):
         """Generate a graph of the world map"""
-        for y, row in enumerate(self.map):
-            for x, col in enumerate(row):
+        for y in range(self.game.map.rows):
+            for x in range(self.game.map.cols):
                 # If current grid position is not a wall
-                if not col:
+                if not self.game.map.is_wall(x, y):
                     # Add the position to the graph
                     self.graph[(x, y)] = self.graph.get(
                         (x, y), []
                     ) + self.get_next_nodes(x, y)
+                    self.weighted_graph[(x, y)] = self.get_weighted_nodes(x, y)
@@ -9,6 +9,13 @@ class Player:
     def __init__(self, game):
         """Initialize player"""
         self.game = game
+        self.reset()
+
+        # diagonal movement correction
+        self.diag_move_corr = 1 / math.sqrt(2)
+
+    def reset(self):
+        """Reset player position & health for a new game"""
         self.x, self.y = PLAYER_POS
         self.angle = PLAYER_ANGLE
         self.shot = False
@@ -17,9 +24,6 @@ class Player:
         self.health_recovery_delay = 500
         self.time_prev = pg.time.get_ticks()
 
-        # diagonal movement correction
-        self.diag_move_corr = 1 / math.sqrt(2)
-
     def recover_health(self):
         """Recover player health"""
         # Check if health recovery delay has passed and player health is less than max health
@@ -131,7 +135,7 @@ class Player:
 
     def check_wall(self, x, y):
         """Check if position is a wall"""
-        return (x, y) not in self.game.map.world_map
+        return not self.game.map.is_wall(x, y)
 
     def check_wall_collision(self, dx, dy):
         """Check if player is colliding with a wall"""
@@ -0,0 +1,174 @@
+import pygame as pg
+from collections import deque
+from time import perf_counter
+from settings import *
+
+
+class FrameProfiler:
+    """Toggleable overlay of per-subsystem frame timings and counters"""
+
+    # Stages shown in the overlay, in display order
+    STAGES = (
+        "ray casting",
+        "column building",
+        "sprite projection",
+        "npc logic",
+        "pathfinding",
+        "sorting",
+        "blitting",
+    )
+    # Counters shown in the overlay, in display order
+    COUNTERS = ("rays cast", "objects to render", "bfs nodes", "sprites culled")
+
+    def __init__(self, game, history=PROFILER_HISTORY):
+        """Initialize frame profiler"""
+        self.game = game
+        self.enabled = False
+        # Methods replaced with timing wrappers as (object, name, original)
+        self.wrapped = []
+        # Stack of time spent in nested stages, so stage times are exclusive
+        self.stack = []
+        # Initialize stage times & counters of the current frame
+        self.times = dict.fromkeys(self.STAGES, 0.0)
+        self.sprites_projected = 0
+        self.nodes_expanded = 0
+        self.frame_start = perf_counter()
+        # Rolling history of stage times & counters
+        self.history = {
+            name: deque(maxlen=history)
+            for name in ("frame", *self.STAGES, *self.COUNTERS)
+        }
+        self.font = pg.font.Font(None, 22)
+
+    def toggle(self):
+        """Turn the profiler on or off"""
+        if self.enabled:
+            self.uninstrument()
+        else:
+            self.instrument()
+        self.enabled = not self.enabled
+
+    def reset(self):
+        """Re-instrument the game after its objects have been recreated"""
+        if self.enabled:
+            self.uninstrument()
+            self.instrument()
+
+    def instrument(self):
+        """Wrap the methods of each game stage with timers"""
+        game = self.game
+        self.wrap(game.raycasting, "ray_cast_engine", "ray casting")
+        self.wrap(game.raycasting, "get_objects_to_render", "column building")
+        self.wrap(game.object_renderer, "draw_walls", "column building")
+        self.wrap(game.object_handler, "project_sprites", "sprite projection")
+        for sprite in game.object_handler.sprite_list + game.object_handler.npc_list:
+            self.count_projections(sprite)
+        for npc in game.object_handler.npc_list:
+            self.wrap(npc, "run_logic", "npc logic")
+        self.wrap(game.pathfinding, "get_path", "pathfinding")
+        self.wrap(game.object_renderer, "sort_game_objects", "sorting")
+        self.wrap(game.object_renderer, "render_game_objects", "blitting")
+        # Start counting from the current state
+        self.nodes_expanded = game.pathfinding.nodes_expanded
+        self.frame_start = perf_counter()
+
+    def uninstrument(self):
+        """Restore the original methods"""
+        for obj, name, original in reversed(self.wrapped):
+            if original is None:
+                # Remove the wrapper to expose the class method again
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.wrapped = []
+
+    def wrap(self, obj, name, stage):
+        """Replace a method of an object with a timed version"""
+        method = getattr(obj, name)
+        stack = self.stack
+        times = self.times
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            stack.append(0.0)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                # Don't count time spent in nested stages
+                times[stage] += elapsed - stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+
+        self.replace(obj, name, timed)
+
+    def count_projections(self, sprite):
+        """Count how many times a sprite is projected onto the screen"""
+        method = sprite.get_sprite_projection
+        raycasting = self.game.raycasting
+
+        def counted():
+            # Sprites hidden behind walls are not added to the objects to render
+            objects = len(raycasting.objects_to_render)
+            method()
+            if len(raycasting.objects_to_render) > objects:
+                self.sprites_projected += 1
+
+        self.replace(sprite, "get_sprite_projection", counted)
+
+    def replace(self, obj, name, wrapper):
+        """Replace a method of an object, remembering how to restore it"""
+        self.wrapped.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def end_frame(self):
+        """Record the stage times & counters of the frame"""
+        game = self.game
+        frame_end = perf_counter()
+        history = self.history
+        history["frame"].append(frame_end - self.frame_start)
+        self.frame_start = frame_end
+        for stage in self.STAGES:
+            history[stage].append(self.times[stage])
+            self.times[stage] = 0.0
+        # Record counters
+        sprites = len(game.object_handler.sprite_list) + len(
+            game.object_handler.npc_list
+        )
+        history["rays cast"].append(game.raycasting.rays_cast)
+        history["objects to render"].append(len(game.raycasting.objects_to_render))
+        history["bfs nodes"].append(
+            game.pathfinding.nodes_expanded - self.nodes_expanded
+        )
+        history["sprites culled"].append(sprites - self.sprites_projected)
+        self.nodes_expanded = game.pathfinding.nodes_expanded
+        self.sprites_projected = 0
+
+    def draw(self):
+        """Draw the profiler overlay"""
+        lines = [f"{'stage':<18}{'avg ms':>8}{'max ms':>8}"]
+        for name in ("frame", *self.STAGES):
+            values = self.history[name]
+            average = sum(values) / len(values) * 1000 if values else 0
+            peak = max(values, default=0) * 1000
+            lines.append(f"{name:<18}{average:8.2f}{peak:8.2f}")
+        lines.append(f"{'counter':<18}{'avg':>8}{'max':>8}")
+        for name in self.COUNTERS:
+            values = self.history[name]
+            average = sum(values) / len(values) if values else 0
+            lines.append(f"{name:<18}{average:8.1f}{max(values, default=0):8}")
+
+        # Draw a translucent background behind the text
+        line_height = self.font.get_linesize()
+        background = pg.Surface((300, line_height * len(lines) + 10), pg.SRCALPHA)
+        background.fill((0, 0, 0, 160))
+        self.game.screen.blit(background, PROFILER_POS)
+        x, y = PROFILER_POS
+        for i, line in enumerate(lines):
+            # Draw each column of the line at a fixed position
+            for column, text in enumerate((line[:18], line[18:26], line[26:])):
+                image = self.font.render(text.strip(), True, "white")
+                offset = (
+                    5 if not column else 210 + 80 * (column - 1) - image.get_width()
+                )
+                self.game.screen.blit(image, (x + offset, y + 5 + i * line_height))
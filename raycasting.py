@@ -1,6 +1,9 @@
 import pygame as pg
+import numpy as np
 import math
+from concurrent.futures import ThreadPoolExecutor
 from settings import *
+from surface_cache import *
 
 
 class RayCasting:
@@ -9,49 +12,114 @@ class RayCasting:
     def __init__(self, game):
         """Initialize ray caster"""
         self.game = game
-        # Initialize ray casting result
+        # Initialize ray casting result, as depth, projection height, texture &
+        # offset arrays and as a tuple per ray for the surfaces render mode
+        self.projection = None
         self.ray_casting_result = []
         # Initialize objects to render
         self.objects_to_render = []
+        # Initialize wall objects of the last ray cast
+        self.wall_objects = []
+        # Initialize number of rays cast in the last update
+        self.rays_cast = 0
+        # Initialize camera & rays of the last ray cast
+        self.invalidate()
         # Get wall textures
         self.textures = self.game.object_renderer.wall_textures
+        # Create cache of scaled wall columns
+        self.column_cache = WallColumnCache(self.textures, self.game.shading)
+        # Select the ray casting engine
+        self.ray_cast_engine = {
+            "python": self.ray_cast,
+            "numpy": self.ray_cast_vectorized,
+            "adaptive": self.ray_cast_adaptive,
+        }[RAY_CASTING_ENGINE]
+        # Split the screen into vertical bands that are cast on a thread pool
+        self.executor = None
+        if RAY_CASTING_THREADS > 1 and RAY_CASTING_ENGINE == "numpy":
+            self.executor = ThreadPoolExecutor(RAY_CASTING_THREADS)
+            self.ray_cast_engine = self.ray_cast_banded
+        # Only cast the newly exposed rays when the camera turns in place
+        elif RAY_CAST_ROTATION_REUSE and RAY_CASTING_ENGINE == "numpy":
+            self.ray_cast_engine = self.ray_cast_incremental
+        # Set the width of the screen column drawn by each ray
+        self.set_scale(SCALE)
+
+    def set_scale(self, scale):
+        """Set the width of the screen column drawn by each ray"""
+        self.scale = scale
+        # Cast enough rays to cover the screen width
+        self.num_rays = -(-WIDTH // scale)
+        self.delta_angle = FOV * scale / WIDTH
+        # Filling in the rays between two adaptive coarse rays is only exact if
+        # no wall tile fits between them, a tile within MAX_DEPTH spans at least
+        # about 1 / MAX_DEPTH radians
+        self.adaptive_step = max(
+            1, min(ADAPTIVE_RAY_STEP, int(1 / (MAX_DEPTH * self.delta_angle)))
+        )
+        # Initialize depth of the wall in each ray column
+        self.depth_buffer = np.full(self.num_rays, np.inf)
+        if self.executor:
+            self.bands = [
+                (band[0], band[-1] + 1)
+                for band in np.array_split(
+                    np.arange(self.num_rays), RAY_CASTING_THREADS
+                )
+            ]
+        # The rays have changed, so cast all of them again
+        self.invalidate()
+
+    def invalidate(self):
+        """Force every ray to be cast again on the next update"""
+        self.camera = None
+        self.cast_pos = None
+        self.cast_first_ray = 0
+        self.cast_depth = self.cast_texture = self.cast_offset = None
 
     def get_objects_to_render(self):
         """Get objects to render based on ray casting result"""
-        # Reset objects to render
-        self.objects_to_render = []
+        # Build the wall columns of each band on the thread pool
+        if self.executor:
+            self.wall_objects = []
+            for walls in self.executor.map(
+                lambda band: self.get_walls(*band), self.bands
+            ):
+                self.wall_objects += walls
+        else:
+            self.wall_objects = self.get_walls(0, len(self.ray_casting_result))
+        # Copy the walls so sprites can be added without changing them
+        self.objects_to_render = list(self.wall_objects)
+
+    def get_walls(self, first_ray, last_ray):
+        """Get the wall columns of a range of rays"""
+        walls = []
         # Iterate through ray casting result
-        for ray, values in enumerate(self.ray_casting_result):
+        for ray in range(first_ray, last_ray):
+            values = self.ray_casting_result[ray]
             # Get ray casting result values
             depth, proj_height, texture, offset = values
+            proj_height = int(proj_height)
+            # Quantize projection height so similar columns share a cached surface
+            if self.column_cache.enabled:
+                proj_height = (
+                    proj_height // WALL_COLUMN_HEIGHT_STEP * WALL_COLUMN_HEIGHT_STEP
+                )
+            # Get scaled wall texture column
+            wall_column = self.column_cache.get_column(
+                texture, offset, proj_height, self.scale
+            )
             # If projection height is less than screen height
             if proj_height < HEIGHT:
-                # Set wall texture
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), 0, SCALE, TEXTURE_SIZE
-                )
-                # Scale wall texture
-                wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
                 # Set wall position
-                wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
+                wall_pos = (ray * self.scale, HALF_HEIGHT - proj_height // 2)
             # If projection height is greater than screen height
             else:
-                # Set height of texture
-                texture_height = TEXTURE_SIZE * HEIGHT / proj_height
-                # Set wall texture
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE),
-                    HALF_TEXTURE_SIZE - texture_height // 2,
-                    SCALE,
-                    texture_height,
-                )
-                # Scale wall texture
-                wall_column = pg.transform.scale(wall_column, (SCALE, HEIGHT))
                 # Set wall position
-                wall_pos = (ray * SCALE, 0)
+                wall_pos = (ray * self.scale, 0)
 
             # Add wall to objects to render
-            self.objects_to_render.append((depth, wall_column, wall_pos))
+            walls.append((depth, wall_column, wall_pos))
+        return walls
 
     def ray_cast(self):
         """Cast rays to create 3D projection"""
@@ -67,7 +135,7 @@ class RayCasting:
 
         # define angle of each ray cast int terms of player angle and FOV
         ray_angle = self.game.player.angle - HALF_FOV + 0.0001
-        for ray in range(NUM_RAYS):
+        for ray in range(self.num_rays):
             sin_a = math.sin(ray_angle)
             cos_a = math.cos(ray_angle)
 
@@ -141,11 +209,305 @@ class RayCasting:
             )
 
             # increment ray angle
-            ray_angle += DELTA_ANGLE
+            ray_angle += self.delta_angle
+
+        # Get the ray casting result as arrays like the numpy engines do
+        depth, proj_height, texture, offset = zip(*self.ray_casting_result)
+        self.projection = (
+            np.array(depth),
+            np.array(proj_height),
+            np.array(texture, dtype=np.uint8),
+            np.array(offset),
+        )
+
+    def march(self, start, step):
+        """Get every grid intersection of a batch of rays, one row per step"""
+        # Accumulate the steps one at a time like the scalar loop does
+        steps = np.empty((MAX_DEPTH + 1, len(start)))
+        steps[0] = start
+        steps[1:] = step
+        return np.add.accumulate(steps, axis=0)
+
+    def get_tiles(self, x, y):
+        """Get the wall texture of the tiles at the given coordinates (0 if empty)"""
+        grid = self.game.map.grid
+        rows, cols = grid.shape
+        # Truncate coordinates towards zero like int() does
+        tile_x = x.astype(np.intp)
+        tile_y = y.astype(np.intp)
+        # Tiles outside of the map are never walls
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        tiles = grid[tile_y.clip(0, rows - 1), tile_x.clip(0, cols - 1)]
+        return np.where(inside, tiles, 0)
+
+    def find_walls(self, x, y, depth):
+        """Find the first wall each ray hits along its intersections"""
+        rays = np.arange(x.shape[1])
+        # Check the first MAX_DEPTH intersections for walls
+        tiles = self.get_tiles(x[:MAX_DEPTH], y[:MAX_DEPTH])
+        hit = tiles > 0
+        found = hit.any(axis=0)
+        # Rays that don't hit a wall stop after MAX_DEPTH steps
+        step = np.where(found, hit.argmax(axis=0), MAX_DEPTH)
+        texture = tiles[step.clip(max=MAX_DEPTH - 1), rays]
+        # Rays that don't hit a wall keep the texture of the last ray that did
+        last_found = np.maximum.accumulate(np.where(found, rays, -1))
+        texture = np.where(last_found >= 0, texture[last_found], 1)
+        return x[step, rays], y[step, rays], depth[step, rays], texture, found
+
+    def cast_rays(self, ox, oy, ray_angles):
+        """Cast a batch of rays at once, returns depth, texture and offset arrays"""
+        return self.trace_rays(ox, oy, ray_angles)[:3]
+
+    def trace_rays(self, ox, oy, ray_angles):
+        """Cast a batch of rays at once, returns depth, texture and offset arrays
+        along with the side (vertical or not), grid line and hit flag of each ray"""
+        # Set map position to the map position of the ray origin
+        x_map, y_map = int(ox), int(oy)
+        sin_a = np.sin(ray_angles)
+        cos_a = np.cos(ray_angles)
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            ### Horizontals ###
+            # Calculate y coordinate and depth of the first horizontal
+            y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+            dy = np.where(sin_a > 0, 1.0, -1.0)
+            depth_hor = (y_hor - oy) / sin_a
+            # Calculate x coordinate of the first horizontal
+            x_hor = ox + depth_hor * cos_a
+            delta_depth = dy / sin_a
+            dx = delta_depth * cos_a
+            # Check for intersections between rays and horizontal lines
+            x_hor, y_hor, depth_hor, texture_hor, found_hor = self.find_walls(
+                self.march(x_hor, dx),
+                self.march(y_hor, dy),
+                self.march(depth_hor, delta_depth),
+            )
+
+            ### Verticals ###
+            # Calculate x coordinate and depth of the first vertical
+            x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+            dx = np.where(cos_a > 0, 1.0, -1.0)
+            depth_vert = (x_vert - ox) / cos_a
+            # Calculate y coordinate of the first vertical
+            y_vert = oy + depth_vert * sin_a
+            delta_depth = dx / cos_a
+            dy = delta_depth * sin_a
+            # Check for intersections between rays and vertical lines
+            x_vert, y_vert, depth_vert, texture_vert, found_vert = self.find_walls(
+                self.march(x_vert, dx),
+                self.march(y_vert, dy),
+                self.march(depth_vert, delta_depth),
+            )
+
+        # Choose the shortest distance & apply texture offset
+        vert = depth_vert < depth_hor
+        depth = np.where(vert, depth_vert, depth_hor)
+        texture = np.where(vert, texture_vert, texture_hor)
+        # Get the grid line and hit flag of the chosen intersection
+        line = np.where(vert, x_vert, y_hor)
+        found = np.where(vert, found_vert, found_hor)
+        y_vert %= 1
+        x_hor %= 1
+        offset = np.where(
+            vert,
+            np.where(cos_a > 0, y_vert, 1 - y_vert),
+            np.where(sin_a > 0, 1 - x_hor, x_hor),
+        )
+        return depth, texture, offset, vert, line, found
+
+    def trace_line(self, ox, oy, ray_angles, vert, line):
+        """Intersect rays with known vertical or horizontal grid lines, returns
+        depth, texture and offset arrays (texture is 0 where there is no wall)"""
+        sin_a = np.sin(ray_angles)
+        cos_a = np.cos(ray_angles)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            # Get the depth & coordinates of the intersection with the line
+            depth = np.where(vert, (line - ox) / cos_a, (line - oy) / sin_a)
+            x = np.where(vert, line, ox + depth * cos_a)
+            y = np.where(vert, oy + depth * sin_a, line)
+            texture = self.get_tiles(x, y)
+        # Apply texture offset
+        x %= 1
+        y %= 1
+        offset = np.where(
+            vert,
+            np.where(cos_a > 0, y, 1 - y),
+            np.where(sin_a > 0, 1 - x, x),
+        )
+        return depth, texture, offset
+
+    def get_ray_angles(self):
+        """Get the angle of each ray in terms of player angle and FOV"""
+        ray_angles = np.full(self.num_rays, self.delta_angle)
+        ray_angles[0] = self.game.player.angle - HALF_FOV + 0.0001
+        return np.add.accumulate(ray_angles)
+
+    def project(self, ray_angles):
+        """Cast a batch of rays from the player and get their 3D projection"""
+        # Cast rays from the player position
+        depth, texture, offset = self.cast_rays(*self.game.player.pos, ray_angles)
+        return self.get_projection(ray_angles, depth, texture, offset)
+
+    def get_projection(self, ray_angles, depth, texture, offset):
+        """Get the 3D projection of rays from their wall hits"""
+        # fix fish eye effect
+        depth = depth * np.cos(self.game.player.angle - ray_angles)
+
+        # 3D projection
+        proj_height = SCREEN_DIST / (depth + 0.0001)
+
+        # ray casting result
+        return depth, proj_height, texture, offset
+
+    def ray_cast_vectorized(self):
+        """Cast all rays at once with numpy to create 3D projection"""
+        self.projection = self.project(self.get_ray_angles())
+
+    def ray_cast_adaptive(self):
+        """Cast a coarse set of rays and only cast the rays between them where
+        the coarse rays hit different walls"""
+        ox, oy = self.game.player.pos
+        ray_angles = self.get_ray_angles()
+        num_rays = self.num_rays
+        # Cast every adaptive_step-th ray and the last ray
+        coarse = np.unique(
+            np.append(np.arange(0, num_rays, self.adaptive_step), -1 % num_rays)
+        )
+        depth = np.empty(num_rays)
+        texture = np.empty(num_rays, dtype=np.uint8)
+        offset = np.empty(num_rays)
+        depth[coarse], texture[coarse], offset[coarse], vert, line, found = (
+            self.trace_rays(ox, oy, ray_angles[coarse])
+        )
+
+        # Coarse rays on either side of each ray
+        right = np.searchsorted(coarse, np.arange(num_rays)).clip(max=len(coarse) - 1)
+        left = (right - 1).clip(min=0)
+        # Rays between two coarse rays that hit the same wall line hit that line too
+        same_line = (
+            found[left]
+            & found[right]
+            & (vert[left] == vert[right])
+            & (line[left] == line[right])
+        )
+        is_coarse = np.zeros(num_rays, dtype=bool)
+        is_coarse[coarse] = True
+        fill = same_line & ~is_coarse
+        depth[fill], fill_texture, offset[fill] = self.trace_line(
+            ox, oy, ray_angles[fill], vert[left[fill]], line[left[fill]]
+        )
+        texture[fill] = fill_texture
+
+        # Cast the rays next to wall edges, and rays that fell in a gap of the line
+        refine = ~is_coarse & ~same_line
+        refine[np.flatnonzero(fill)[fill_texture == 0]] = True
+        if refine.any():
+            depth[refine], texture[refine], offset[refine] = self.cast_rays(
+                ox, oy, ray_angles[refine]
+            )
+        self.rays_cast = len(coarse) + int(refine.sum())
+        self.projection = self.get_projection(ray_angles, depth, texture, offset)
+
+    def ray_cast_banded(self):
+        """Cast each band of rays on the thread pool to create 3D projection"""
+        ray_angles = self.get_ray_angles()
+        bands = self.executor.map(
+            lambda band: self.project(ray_angles[band[0] : band[1]]), self.bands
+        )
+        # Join the arrays of the bands
+        self.projection = tuple(np.concatenate(arrays) for arrays in zip(*bands))
+
+    def ray_cast_incremental(self):
+        """Cast only the rays that weren't cast from the same position last time"""
+        pos = self.game.player.pos
+        # Snap the rays to a fixed lattice of angles so turning shifts whole rays
+        first_ray = round((self.game.player.angle - HALF_FOV) / self.delta_angle)
+        rays = np.arange(first_ray, first_ray + self.num_rays)
+        ray_angles = rays * self.delta_angle + 0.0001
+
+        # Find the rays cast last time from the same position
+        reused = np.zeros(self.num_rays, dtype=bool)
+        if pos == self.cast_pos:
+            # Index of each ray in the last cast
+            shift = first_ray - self.cast_first_ray
+            # Wrap the shift to a full turn if the lattice repeats every turn
+            lattice_size = math.tau / self.delta_angle
+            if abs(lattice_size - round(lattice_size)) < 1e-6:
+                shift = (shift + self.num_rays) % round(lattice_size) - self.num_rays
+            previous = np.arange(self.num_rays) + shift
+            reused = (previous >= 0) & (previous < self.num_rays)
+        depth = np.empty(self.num_rays)
+        texture = np.empty(self.num_rays, dtype=np.uint8)
+        offset = np.empty(self.num_rays)
+        if reused.any():
+            # Reuse the wall hits of the overlapping rays
+            previous = previous[reused]
+            depth[reused] = self.cast_depth[previous]
+            texture[reused] = self.cast_texture[previous]
+            offset[reused] = self.cast_offset[previous]
+
+        # Cast the newly exposed rays
+        cast = ~reused
+        self.rays_cast = int(cast.sum())
+        if self.rays_cast:
+            depth[cast], texture[cast], offset[cast] = self.cast_rays(
+                *pos, ray_angles[cast]
+            )
+
+        # Remember the wall hits for the next update
+        self.cast_pos, self.cast_first_ray = pos, first_ray
+        self.cast_depth, self.cast_texture, self.cast_offset = depth, texture, offset
+        self.projection = self.get_projection(ray_angles, depth, texture, offset)
+
+    def get_visible_spans(self, left, right, depth):
+        """Get the spans of screen columns between left and right where an object
+        at a depth is in front of the walls"""
+        scale = self.scale
+        # Get the ray columns covered by the object
+        first_ray = max(left // scale, 0)
+        last_ray = min(-(-right // scale), self.num_rays)
+        # Objects that are completely off screen are not visible
+        if first_ray >= last_ray:
+            return []
+        visible = self.depth_buffer[first_ray:last_ray] > depth
+        # Objects that are completely in front of walls are not clipped
+        if visible.all():
+            return [(left, right)]
+        # Get each run of visible ray columns
+        edges = np.flatnonzero(np.diff(visible.astype(np.int8))) + 1
+        return [
+            (
+                max((first_ray + start) * scale, left),
+                min((first_ray + stop) * scale, right),
+            )
+            for start, stop in zip(
+                [0, *edges.tolist()], [*edges.tolist(), len(visible)]
+            )
+            if visible[start]
+        ]
 
     def update(self):
         """Update ray casting"""
+        camera = self.game.player.pos, self.game.player.angle
+        # The map is static, so a still camera sees the same walls as last frame
+        if camera == self.camera:
+            self.rays_cast = 0
+            self.objects_to_render = list(self.wall_objects)
+            return
+        self.camera = camera
         # Cast rays to create 3D projection
-        self.ray_cast()
+        self.rays_cast = self.num_rays
+        self.ray_cast_engine()
+        # Get the depth of the wall in each ray column
+        self.depth_buffer = self.projection[0]
         # Get objects to render based on ray casting result
-        self.get_objects_to_render()
+        if WALL_RENDER_MODE == "framebuffer":
+            # Walls are drawn straight into the frame by the object renderer
+            self.objects_to_render = []
+        else:
+            # Wall columns are built one ray at a time from Python values
+            self.ray_casting_result = list(
+                zip(*(values.tolist() for values in self.projection))
+            )
+            self.get_objects_to_render()
@@ -23,6 +23,13 @@ MOUSE_BORDER_RIGHT = WIDTH - MOUSE_BORDER_LEFT
 
 FLOOR_COLOR = (30, 30, 30)
 
+# size of a map tile on the minimap in pixels
+MINIMAP_SCALE = 8
+# only show the parts of the minimap the player has been near
+MINIMAP_FOG_OF_WAR = False
+# distance in tiles around the player that is revealed on the minimap
+MINIMAP_REVEAL_RADIUS = 4
+
 FOV = math.pi / 3
 HALF_FOV = FOV / 2
 NUM_RAYS = WIDTH // 2
@@ -30,8 +37,98 @@ HALF_NUM_RAYS = NUM_RAYS // 2
 DELTA_ANGLE = FOV / NUM_RAYS
 MAX_DEPTH = 20
 
+# frames of history averaged by the profiler overlay (toggled with F3)
+PROFILER_HISTORY = 60
+PROFILER_POS = 10, 100
+
+# ray casting engine: "python" (one ray at a time), "numpy" (all rays at once)
+# or "adaptive" (every ADAPTIVE_RAY_STEP-th ray, plus the rays near wall edges)
+RAY_CASTING_ENGINE = "numpy"
+# lowered at wide rays so coarse rays are less than 1 / MAX_DEPTH radians apart,
+# no wall tile within MAX_DEPTH can then hide between them (6 at scale 8)
+ADAPTIVE_RAY_STEP = 8
+# threads casting vertical bands of rays & building their wall columns
+# (numpy engine only, 1 casts every ray on the main thread)
+RAY_CASTING_THREADS = 1
+# snap rays to fixed angles so turning in place only casts the newly exposed rays
+# (numpy engine only), walls then turn in whole ray steps & drift up to half a
+# ray from the sprites & floor, which are projected at the exact player angle
+RAY_CAST_ROTATION_REUSE = False
+
+# dynamic resolution widens the screen column drawn by each ray (casting fewer
+# rays) when the smoothed frame time goes over budget, and narrows it again
+# when frames take less than DYNAMIC_RESOLUTION_HEADROOM of the budget
+DYNAMIC_RESOLUTION = False
+FRAME_TIME_BUDGET = 1000 / 60
+DYNAMIC_RESOLUTION_SCALES = 2, 3, 4, 6, 8
+DYNAMIC_RESOLUTION_HEADROOM = 0.7
+DYNAMIC_RESOLUTION_COOLDOWN = 30
+
 SCREEN_DIST = HALF_WIDTH / math.tan(HALF_FOV)
 SCALE = WIDTH // NUM_RAYS
 
 TEXTURE_SIZE = 256
 HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
+
+# wall texture cast onto the floor & ceiling, None for a flat floor and the sky
+FLOOR_TEXTURE = None
+CEILING_TEXTURE = None
+# width & height in screen pixels of each cast floor & ceiling pixel
+FLOOR_RESOLUTION_SCALE = 2
+
+# wall render mode: "surfaces" (one scaled surface per ray) or "framebuffer"
+# (textured columns written straight into the frame's pixels)
+WALL_RENDER_MODE = "surfaces"
+
+# number of brightness levels walls, sprites & floors are darkened to with depth,
+# more levels give smoother shading, 0 turns shading off
+SHADING_LEVELS = 0
+# depth at which shading reaches the darkest level & its brightness
+SHADING_DISTANCE = 12
+SHADING_MIN_BRIGHTNESS = 0.2
+
+# cache scaled wall columns, a moving camera rarely draws the same column twice
+# so this is only worth it for mostly still cameras
+WALL_COLUMN_CACHE = False
+# scaled wall columns are cached per projection height rounded down to this step
+WALL_COLUMN_HEIGHT_STEP = 2
+# memory budget of the scaled wall column cache in bytes
+WALL_COLUMN_CACHE_MEMORY = 32 * 1024 * 1024
+
+# scaled sprites are cached per projection height rounded down to this step
+SPRITE_HEIGHT_STEP = 4
+# memory budget of the scaled sprite cache in bytes
+SPRITE_CACHE_MEMORY = 64 * 1024 * 1024
+
+# load decoded & scaled images and sounds from a pack file, which is rebuilt
+# when the source files change
+ASSET_PACK = True
+ASSET_PACK_PATH = "cache/assets.pack"
+# threads that decode image files which aren't in the asset pack
+ASSET_LOADER_THREADS = 4
+# print the time spent loading each asset group
+ASSET_LOADER_REPORT = False
+
+# npc pathfinding: "bfs" (a search from each npc to the player), "astar" (A*
+# search with diagonal steps costing more & no cutting of wall corners),
+# "hpa" (A* over the entrances between clusters of tiles, for large maps,
+# ignoring other npcs) or "flow_field" (one search out from the player that
+# every npc reads its next step from)
+PATHFINDING_MODE = "bfs"
+# cost of a diagonal step for A* search
+DIAGONAL_COST = math.sqrt(2)
+# width & height in tiles of the clusters searched by hierarchical pathfinding
+HPA_CLUSTER_SIZE = 16
+# paths cached by start, goal, map version & npc occupancy (for searches avoiding npcs)
+PATH_CACHE_SIZE = 4096
+# answer npc line of sight from a table of which tiles can see each other,
+# built once per map & cached on disk, only casting rays between tiles that
+# can partly see each other & once walls of the map have changed
+VISIBILITY_TABLE = True
+VISIBILITY_CACHE_DIR = "cache"
+# tables of this many maps are kept on disk (at most 256 KB each), the least
+# recently played removed first
+VISIBILITY_CACHE_TABLES = 16
+# maps with more tiles than this always cast rays, building the table takes time
+# growing with the square of the tiles (about half a second for 512 tiles)
+VISIBILITY_MAX_TILES = 512
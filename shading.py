@@ -0,0 +1,55 @@
+import pygame as pg
+import numpy as np
+from settings import *
+
+
+class Shading:
+    """Darkening of walls, sprites and floors with depth, in precomputed levels"""
+
+    def __init__(self, levels=SHADING_LEVELS):
+        """Initialize shading"""
+        self.set_levels(levels)
+
+    def set_levels(self, levels):
+        """Set the number of brightness levels, 0 to turn shading off"""
+        self.levels = levels
+        # Use a single full brightness level when shading is off
+        self.count = max(levels, 1)
+        # Scale depths to levels
+        self.level_scale = levels / SHADING_DISTANCE
+        # Brightness of each level, from full brightness to the darkest
+        self.brightness = np.linspace(
+            1, SHADING_MIN_BRIGHTNESS if levels > 1 else 1, self.count
+        )
+
+    def get_level(self, depth):
+        """Get the brightness level of a depth"""
+        return min(int(depth * self.level_scale), self.count - 1)
+
+    def get_levels(self, depths):
+        """Get the brightness level of each depth in an array"""
+        return np.minimum((depths * self.level_scale).astype(np.int32), self.count - 1)
+
+    def shade(self, surface, level):
+        """Get a copy of a surface darkened to a brightness level"""
+        if not level:
+            return surface
+        return self.darken(surface.copy(), level)
+
+    def darken(self, surface, level):
+        """Darken a surface to a brightness level in place"""
+        if level:
+            brightness = round(self.brightness[level] * 255)
+            surface.fill((brightness,) * 3, special_flags=pg.BLEND_RGB_MULT)
+        return surface
+
+    def get_shaded_pixels(self, surface, target):
+        """Get the pixels of a surface at every brightness level in the pixel
+        format of a target surface, as an array indexed by [level, x, y]"""
+        surface = surface.convert(target)
+        return np.stack(
+            [
+                pg.surfarray.array2d(self.shade(surface, level))
+                for level in range(self.count)
+            ]
+        )
@@ -1,7 +1,6 @@
 import pygame as pg
 from settings import *
-import os
-from collections import deque
+from surface_cache import *
 
 
 class SpriteObject:
@@ -19,8 +18,10 @@ class SpriteObject:
         self.game = game
         self.player = game.player
         self.x, self.y = pos
+        # Get the cache of sprite frames shared by all sprites
+        self.sprite_cache = game.sprite_cache
         # Load the sprite image
-        self.image = pg.image.load(path).convert_alpha()
+        self.image = self.sprite_cache.load(path)
         # Set the sprite image attributes
         self.IMAGE_WIDTH = self.image.get_width()
         self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
@@ -43,21 +44,39 @@ class SpriteObject:
         """Create a 3D projection of the sprite"""
         # Calculate the sprite projection
         proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
-        proj_width, proj_height = proj * self.IMAGE_RATIO, proj
-
-        # Scale the sprite image
-        image = pg.transform.scale(self.image, (proj_width, proj_height))
+        # Get the size of the sprite image scaled to the (quantized) projection
+        proj_width, proj_height = self.sprite_cache.get_scaled_size(
+            self.image, int(proj)
+        )
+        self.sprite_half_width = proj_width // 2
 
         # Calculate the sprite position
-        self.sprite_half_width = proj_width // 2
         height_shift = proj_height * self.SPRITE_HEIGHT_SHIFT
-        pos = (
-            self.screen_x - self.sprite_half_width,
-            HALF_HEIGHT - proj_height // 2 + height_shift,
+        x = self.screen_x - self.sprite_half_width
+        y = HALF_HEIGHT - proj_height // 2 + height_shift
+
+        # Get the parts of the sprite in front of walls, skipping sprites that are
+        # completely behind walls before scaling them
+        raycasting = self.game.raycasting
+        left = int(x)
+        spans = raycasting.get_visible_spans(left, left + proj_width, self.norm_dist)
+        if not spans:
+            return
+
+        # Get the scaled sprite image
+        image = self.sprite_cache.get_scaled(
+            self.image, int(proj), self.game.shading.get_level(self.norm_dist)
         )
 
-        # Add the sprite projection to the list of objects to render
-        self.game.raycasting.objects_to_render.append((self.norm_dist, image, pos))
+        # Add the parts of the sprite in front of walls to the objects to render
+        for start, stop in spans:
+            if stop - start == proj_width:
+                part = image
+            else:
+                part = image.subsurface(start - left, 0, stop - start, proj_height)
+            raycasting.objects_to_render.append(
+                (self.norm_dist, part, (x + start - left, y))
+            )
 
     def get_sprite(self):
         """Get the sprite projection attributes"""
@@ -94,6 +113,11 @@ class SpriteObject:
     def update(self):
         """Update the sprite projection"""
         self.get_sprite()
+        self.update_state()
+
+    def update_state(self):
+        """Update the sprite, apart from its projection"""
+        pass
 
 
 class AnimatedSprite(SpriteObject):
@@ -114,23 +138,24 @@ class AnimatedSprite(SpriteObject):
         self.animation_time = animation_time
         self.path = path.rsplit("/", 1)[0]
         self.images = self.get_images(self.path)
+        # Current frame of each animation, the frames themselves are shared
+        self.frame_indices = {}
         self.animation_time_prev = pg.time.get_ticks()
         self.animation_trigger = False
 
-    def update(self):
+    def update_state(self):
         """Update the sprite animation"""
-        # Update derived sprite animations
-        super().update()
         # Update sprite animation
         self.check_animation_time()
         self.animate(self.images)
 
     def animate(self, images):
         """Animate the sprite"""
-        # If an animation frame is triggered, rotate the sprite image
+        # If an animation frame is triggered, show the next frame of the animation
         if self.animation_trigger:
-            images.rotate(-1)
-            self.image = images[0]
+            index = (self.frame_indices.get(images, 0) + 1) % len(images)
+            self.frame_indices[images] = index
+            self.image = images[index]
 
     def check_animation_time(self):
         """Check if it is time to animate the sprite"""
@@ -145,14 +170,5 @@ class AnimatedSprite(SpriteObject):
             self.animation_trigger = True
 
     def get_images(self, path):
-        """Get the sprite animation images"""
-        # Create a deque of sprite animation images
-        images = deque()
-        # Get the sprite animation image paths
-        for file_name in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file_name)):
-                # Load the sprite animation image
-                img = pg.image.load(path + "/" + file_name).convert_alpha()
-                # Add image to the deque
-                images.append(img)
-        return images
+        """Get the sprite animation images, shared by all sprites"""
+        return self.sprite_cache.load_animation(path)
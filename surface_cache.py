@@ -0,0 +1,156 @@
+import pygame as pg
+import os
+from lru_cache import LRUCache
+from settings import *
+
+
+class SurfaceCache(LRUCache):
+    """Least recently used cache of surfaces bounded by memory use in bytes"""
+
+    @staticmethod
+    def get_size(surface):
+        """Get the number of bytes used by a surface's pixels"""
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class WallColumnCache:
+    """Cache of scaled wall texture columns"""
+
+    def __init__(
+        self,
+        textures,
+        shading,
+        enabled=WALL_COLUMN_CACHE,
+        max_bytes=WALL_COLUMN_CACHE_MEMORY,
+    ):
+        """Initialize wall column cache, when it isn't enabled every column is
+        scaled again"""
+        self.textures = textures
+        self.enabled = enabled
+        # Darkens columns with depth
+        self.shading = shading
+        # Map column widths & brightness levels to the strips of every wall texture
+        self.strips = {}
+        # Initialize the cache of scaled columns
+        self.cache = SurfaceCache(max_bytes)
+
+    def get_strips(self, scale, level=0):
+        """Get the column strips of every wall texture for a column width, darkened
+        to a brightness level"""
+        strips = self.strips.get((scale, level))
+        if strips is None:
+            # Slice every (shaded) wall texture into scale wide column strips once,
+            # one per texel offset (subsurfaces share the texture's pixels)
+            strips = self.strips[scale, level] = {
+                texture: [
+                    shaded.subsurface(x, 0, scale, TEXTURE_SIZE)
+                    for x in range(TEXTURE_SIZE - scale + 1)
+                ]
+                for texture, image in self.textures.items()
+                for shaded in [self.shading.shade(image, level)]
+            }
+        return strips
+
+    def get_column(self, texture, offset, proj_height, scale=SCALE):
+        """Get a wall column scaled to a (quantized) projection height and shaded
+        by the depth of that height"""
+        # Get the strip at the texture offset
+        strip = int(offset * (TEXTURE_SIZE - scale))
+        if not self.enabled:
+            level = self.shading.get_level(SCREEN_DIST / proj_height)
+            return self.scale_column(
+                self.get_strips(scale, level)[texture][strip], proj_height
+            )
+        key = texture, scale, strip, proj_height
+        column = self.cache.get(key)
+        if column is None:
+            # The projection height sets the depth, so it also sets the shading
+            level = self.shading.get_level(SCREEN_DIST / proj_height)
+            column = self.scale_column(
+                self.get_strips(scale, level)[texture][strip], proj_height
+            )
+            self.cache.put(key, column)
+        return column
+
+    @staticmethod
+    def scale_column(strip, proj_height):
+        """Scale a wall strip to its projection height, cropped to the screen"""
+        scale = strip.get_width()
+        # If projection height is less than screen height
+        if proj_height < HEIGHT:
+            return pg.transform.scale(strip, (scale, proj_height))
+        # Otherwise only scale the part of the strip that is on screen
+        texture_height = TEXTURE_SIZE * HEIGHT / proj_height
+        strip = strip.subsurface(
+            0, HALF_TEXTURE_SIZE - texture_height // 2, scale, texture_height
+        )
+        return pg.transform.scale(strip, (scale, HEIGHT))
+
+    def clear(self):
+        """Remove the strips and scaled columns, so they are shaded again"""
+        self.strips.clear()
+        self.cache.clear()
+
+    def stats(self):
+        """Get the column cache statistics"""
+        return self.cache.stats()
+
+
+class SpriteCache:
+    """Cache of sprite frames and their scaled versions, shared by all sprites"""
+
+    def __init__(self, assets, shading, max_bytes=SPRITE_CACHE_MEMORY):
+        """Initialize sprite cache"""
+        # Asset pack the frames are loaded from
+        self.assets = assets
+        # Darkens sprites with depth
+        self.shading = shading
+        # Map image paths to loaded frames, so sprites share the same frames
+        self.images = {}
+        # Map directory paths to the animation frames in them
+        self.animations = {}
+        # Initialize the cache of scaled frames
+        self.cache = SurfaceCache(max_bytes)
+
+    def load(self, path):
+        """Load a sprite frame, or get it if it is already loaded"""
+        image = self.images.get(path)
+        if image is None:
+            image = self.images[path] = self.assets.load_image(path)
+        return image
+
+    def load_animation(self, path):
+        """Load the frames of an animation directory, or get them if they are
+        already loaded"""
+        frames = self.animations.get(path)
+        if frames is None:
+            # Load every file in the directory as a frame
+            frames = self.animations[path] = tuple(
+                self.load(path + "/" + file_name)
+                for file_name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, file_name))
+            )
+        return frames
+
+    @staticmethod
+    def get_scaled_size(image, proj_height):
+        """Get the size of a frame scaled to a projection height by get_scaled"""
+        # Round the height down so sprites at similar distances share a surface
+        proj_height = max(proj_height // SPRITE_HEIGHT_STEP * SPRITE_HEIGHT_STEP, 1)
+        return int(proj_height * image.get_width() / image.get_height()), proj_height
+
+    def get_scaled(self, image, proj_height, level=0):
+        """Get a frame scaled to a projection height, keeping its aspect ratio, and
+        darkened to a brightness level"""
+        size = self.get_scaled_size(image, proj_height)
+        key = image, size[1], level
+        scaled = self.cache.get(key)
+        if scaled is None:
+            scaled = pg.transform.scale(image, size)
+            self.shading.darken(scaled, level)
+            self.cache.put(key, scaled)
+        return scaled
+
+    def stats(self):
+        """Get the scaled sprite cache statistics"""
+        return self.cache.stats()
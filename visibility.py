@@ -0,0 +1,237 @@
+import numpy as np
+import hashlib
+import os
+from settings import *
+
+
+class VisibilityTable:
+    """Potentially visible set of the map: which tiles can see each other,
+    built once per map and cached on disk"""
+
+    # Values of the table for a pair of tiles
+    HIDDEN, VISIBLE, MARGINAL = 0, 1, 2
+    # Positions inside each tile the sight lines between two tiles start & end at,
+    # a 3x3 grid from just inside the corners to the center
+    SAMPLE_OFFSETS = tuple(
+        (x, y) for x in (0.001, 0.5, 0.999) for y in (0.001, 0.5, 0.999)
+    )
+    # Tile pairs whose sight lines are tested at once while building
+    CHUNK_SIZE = 4096
+
+    def __init__(self, game, path=VISIBILITY_CACHE_DIR):
+        """Initialize visibility table and load it for the game's map"""
+        self.game = game
+        self.path = path
+        # Table indexed by [tile, tile], tiles numbered row by row
+        self.table = None
+        # Map & map version the table was loaded for
+        self.map = None
+        self.version = None
+        # Count lookups answered by the table & pairs left to the exact test
+        self.hits = 0
+        self.marginal = 0
+        self.get_table()
+
+    def get_table(self):
+        """Get the table of the game's map, loading or building it for a new map,
+        None once walls of the map have changed"""
+        game_map = self.game.map
+        if game_map is not self.map:
+            self.map, self.version = game_map, game_map.version
+            self.table = self.load(game_map)
+        # Building takes too long to do again on the main thread every time a
+        # wall changes, so cast rays instead
+        if game_map.version != self.version:
+            return None
+        return self.table
+
+    def is_visible(self, tile, other_tile):
+        """Check if a tile can see another tile, None if it depends on the
+        positions inside the tiles"""
+        table = self.get_table()
+        if table is None:
+            return None
+        cols = self.game.map.cols
+        value = table[tile[1] * cols + tile[0], other_tile[1] * cols + other_tile[0]]
+        if value == self.MARGINAL:
+            self.marginal += 1
+            return None
+        self.hits += 1
+        return value == self.VISIBLE
+
+    def get_hash(self, game_map):
+        """Get a hash of the walls of a map and the settings the table depends on"""
+        data = hashlib.sha1(
+            f"{game_map.cols}x{game_map.rows}:{MAX_DEPTH}:{self.SAMPLE_OFFSETS}".encode()
+        )
+        data.update(bytes(game_map.tiles))
+        return data.hexdigest()[:16]
+
+    def load(self, game_map):
+        """Load the table of a map from disk, building & saving it if it isn't
+        cached yet"""
+        # The table grows with the square of the number of tiles
+        if not VISIBILITY_TABLE or game_map.cols * game_map.rows > VISIBILITY_MAX_TILES:
+            return None
+        path = os.path.join(self.path, f"visibility-{self.get_hash(game_map)}.npy")
+        try:
+            table = np.load(path)
+        except (OSError, ValueError):
+            table = None
+        if table is not None:
+            # Mark the table as recently played so it is removed last
+            os.utime(path)
+            return table
+        table = self.build(game_map)
+        # Write to a temporary file first so a failed write leaves no table
+        os.makedirs(self.path, exist_ok=True)
+        with open(path + ".tmp", "wb") as file:
+            np.save(file, table)
+        os.replace(path + ".tmp", path)
+        self.remove_old_tables()
+        return table
+
+    def remove_old_tables(self, max_tables=VISIBILITY_CACHE_TABLES):
+        """Remove the least recently played tables beyond the number kept on disk"""
+        paths = [
+            os.path.join(self.path, name)
+            for name in os.listdir(self.path)
+            if name.startswith("visibility-") and name.endswith(".npy")
+        ]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[max_tables:]:
+            os.remove(path)
+
+    def build(self, game_map):
+        """Build the table of a map by testing sight lines between sample
+        positions in every pair of open tiles"""
+        walls = game_map.grid > 0
+        rows, cols = walls.shape
+        table = np.full((rows * cols, rows * cols), self.MARGINAL, dtype=np.uint8)
+        # Get the open tiles, the player & npcs are never inside walls
+        ys, xs = np.nonzero(~walls)
+        tiles = ys * cols + xs
+        # Tiles can always see themselves
+        table[tiles, tiles] = self.VISIBLE
+        # Get each pair of open tiles once, sight lines work both ways
+        first, second = np.triu_indices(len(tiles), 1)
+        # Leave pairs the ray cast gives up on before reaching to the exact test
+        near = (abs(xs[first] - xs[second]) < MAX_DEPTH) & (
+            abs(ys[first] - ys[second]) < MAX_DEPTH
+        )
+        first, second = first[near], second[near]
+        # Pairs with no walls in the rectangle of tiles around them can always see
+        # each other, count the walls with a summed area table
+        wall_counts = np.zeros((rows + 1, cols + 1), dtype=np.int32)
+        wall_counts[1:, 1:] = walls.cumsum(0).cumsum(1)
+        x0, x1 = np.minimum(xs[first], xs[second]), np.maximum(xs[first], xs[second])
+        y0, y1 = np.minimum(ys[first], ys[second]), np.maximum(ys[first], ys[second])
+        open_rect = (
+            wall_counts[y1 + 1, x1 + 1]
+            - wall_counts[y0, x1 + 1]
+            - wall_counts[y1 + 1, x0]
+            + wall_counts[y0, x0]
+        ) == 0
+        table[tiles[first[open_rect]], tiles[second[open_rect]]] = self.VISIBLE
+        table[tiles[second[open_rect]], tiles[first[open_rect]]] = self.VISIBLE
+        first, second = first[~open_rect], second[~open_rect]
+
+        # Sample positions inside a tile, as (x, y) offsets
+        offsets = np.array(self.SAMPLE_OFFSETS)
+        # Get the start & end sample positions of each sight line between two
+        # tiles, the lines between the corners & the centers are tested first
+        starts, ends = np.indices((len(offsets), len(offsets))).reshape(2, -1)
+        coarse = (starts % 2 == 0) & (ends % 2 == 0)
+        coarse_lines = offsets[starts[coarse]], offsets[ends[coarse]]
+        fine_lines = offsets[starts[~coarse]], offsets[ends[~coarse]]
+        for chunk in range(0, len(first), self.CHUNK_SIZE):
+            a = first[chunk : chunk + self.CHUNK_SIZE]
+            b = second[chunk : chunk + self.CHUNK_SIZE]
+            # Pairs where some of the first lines are clear & some blocked are
+            # marginal whatever the other lines do
+            blocked = self.get_blocked_lines(
+                xs[a], ys[a], xs[b], ys[b], *coarse_lines, walls
+            )
+            clear, hidden = ~blocked.any(axis=1), blocked.all(axis=1)
+            (uniform,) = np.nonzero(clear | hidden)
+            # Pairs where every sight line is clear or every one is blocked don't
+            # depend on the positions inside the tiles
+            blocked = self.get_blocked_lines(
+                xs[a[uniform]],
+                ys[a[uniform]],
+                xs[b[uniform]],
+                ys[b[uniform]],
+                *fine_lines,
+                walls,
+            )
+            values = np.full(len(a), self.MARGINAL, dtype=np.uint8)
+            values[uniform[clear[uniform] & ~blocked.any(axis=1)]] = self.VISIBLE
+            values[uniform[hidden[uniform] & blocked.all(axis=1)]] = self.HIDDEN
+            table[tiles[a], tiles[b]] = values
+            table[tiles[b], tiles[a]] = values
+        return table
+
+    def get_blocked_lines(self, x0, y0, x1, y1, starts, ends, walls):
+        """Check which sight lines between pairs of tiles pass through a wall
+        tile, for each pair & each line from a start to an end offset"""
+        blocked = self.get_blocked(
+            (x0[:, None] + starts[:, 0]).ravel(),
+            (y0[:, None] + starts[:, 1]).ravel(),
+            (x1[:, None] + ends[:, 0]).ravel(),
+            (y1[:, None] + ends[:, 1]).ravel(),
+            walls,
+        )
+        return blocked.reshape(len(x0), -1)
+
+    @staticmethod
+    def get_blocked(x0, y0, x1, y1, walls):
+        """Check which sight lines between positions pass through a wall tile"""
+        rows, cols = walls.shape
+        blocked = np.zeros(len(x0), dtype=bool)
+        # A line passes through the tiles on both sides of each grid line it
+        # crosses, step each line along the vertical grid lines it crosses
+        left, right = np.minimum(x0, x1), np.maximum(x0, x1)
+        (lines,) = np.nonzero(np.floor(left) + 1 < right)
+        slope = (y1[lines] - y0[lines]) / (x1[lines] - x0[lines])
+        x = np.floor(left[lines]) + 1
+        y = y0[lines] + (x - x0[lines]) * slope
+        end = right[lines]
+        while len(lines):
+            row = y.astype(np.int32).clip(0, rows - 1)
+            col = x.astype(np.int32)
+            hit = walls[row, col - 1] | walls[row, col]
+            blocked[lines[hit]] = True
+            # Keep the lines that cross another grid line & aren't blocked yet
+            x += 1
+            y += slope
+            keep = (x < end) & ~hit
+            lines, x, y, slope, end = (
+                lines[keep],
+                x[keep],
+                y[keep],
+                slope[keep],
+                end[keep],
+            )
+        # Then along the horizontal grid lines
+        top, bottom = np.minimum(y0, y1), np.maximum(y0, y1)
+        (lines,) = np.nonzero((np.floor(top) + 1 < bottom) & ~blocked)
+        slope = (x1[lines] - x0[lines]) / (y1[lines] - y0[lines])
+        y = np.floor(top[lines]) + 1
+        x = x0[lines] + (y - y0[lines]) * slope
+        end = bottom[lines]
+        while len(lines):
+            col = x.astype(np.int32).clip(0, cols - 1)
+            row = y.astype(np.int32)
+            hit = walls[row - 1, col] | walls[row, col]
+            blocked[lines[hit]] = True
+            y += 1
+            x += slope
+            keep = (y < end) & ~hit
+            lines, x, y, slope, end = (
+                lines[keep],
+                x[keep],
+                y[keep],
+                slope[keep],
+                end[keep],
+            )
+        return blocked
@@ -16,26 +16,22 @@ class Weapon(AnimatedSprite):
             game=game, path=path, scale=scale, animation_time=animation_time
         )
         # Scale the weapon images
-        self.images = deque(
-            [
-                pg.transform.smoothscale(
-                    img,
-                    (self.image.get_width() * scale, self.image.get_height() * scale),
-                )
-                for img in self.images
-            ]
+        self.images = tuple(
+            pg.transform.smoothscale(
+                img,
+                (self.image.get_width() * scale, self.image.get_height() * scale),
+            )
+            for img in self.images
         )
         # Set the weapon position to the bottom center of the screen
         self.weapon_pos = (
             HALF_WIDTH - self.images[0].get_width() // 2,
             HEIGHT - self.images[0].get_height(),
         )
-        # Reloading flag
-        self.reloading = False
         # Number of images in the weapon animation
         self.num_images = len(self.images)
-        # Frame counter
-        self.frame_counter = 0
+        # Reset reloading flag & frame counter
+        self.reset()
         # Weapon damage
         self.damage = 75
         self.weapon_types = {
@@ -44,6 +40,14 @@ class Weapon(AnimatedSprite):
         }
         self.current_weapon_type = "shotgun"  # Default to 'pistol' when the game starts
 
+    def reset(self):
+        """Reset the weapon animation for a new game"""
+        # Reloading flag
+        self.reloading = False
+        # Frame counter
+        self.frame_counter = 0
+        self.image = self.images[0]
+
     def change_weapon(self, weapon_type):
         if weapon_type in self.weapon_types:
             self.current_weapon_type = weapon_type
@@ -56,12 +60,10 @@ class Weapon(AnimatedSprite):
             self.game.player.shot = False
             # If animation frame is triggered
             if self.animation_trigger:
-                # Rotate the weapon images
-                self.images.rotate(-1)
-                # Update the weapon image
-                self.image = self.images[0]
                 # Increment the frame counter
                 self.frame_counter += 1
+                # Update the weapon image
+                self.image = self.images[self.frame_counter % self.num_images]
                 # If the animation is complete
                 if self.frame_counter == self.num_images:
                     # Reset reloading flag
@@ -71,7 +73,9 @@ class Weapon(AnimatedSprite):
 
     def draw(self):
         """Draw the weapon"""
-        self.game.screen.blit(self.images[0], self.weapon_pos)
+        self.game.screen.blit(
+            self.images[self.frame_counter % self.num_images], self.weapon_pos
+        )
 
     def update(self):
         """Update the weapon animation"""